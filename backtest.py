@@ -0,0 +1,142 @@
+# Betting backtest of the pre-match Elo columns against the AvgW/AvgL odds.
+# The matches are loaded once, every rating-independent quantity (recent match
+# counts, model probabilities, edges) is computed as whole columns, and a sweep
+# over edge thresholds and eligibility rules is a single broadcast over
+# (rule, threshold, match) arrays.
+#
+# Usage: python3 backtest.py
+import time
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from db_connect import get_engine
+from elo_engine import RECENT_FORM_DAYS, to_days
+
+KELLY_FRACTION = 0.25  # Share of the full Kelly stake bet under "kelly" staking
+RATING_COLUMNS = {  # Pre-match rating the model probability is computed from
+    "overall": ("winner_overall_elo", "loser_overall_elo"),
+    "surface": ("winner_surface_elo", "loser_surface_elo"),
+}
+STAKING = ["flat", "kelly"]
+RESULTS_FILE = "backtest_results.csv"
+
+# Grid evaluated when the script is run directly
+EDGE_THRESHOLDS = np.round(np.arange(0.0, 0.31, 0.02), 2)
+ELIGIBILITY_RULES = [(0, 0), (5, 25), (5, 50), (10, 25), (10, 50)]  # (min recent matches, min career matches)
+
+def load_backtest_matches(engine):
+    """Matches with odds and pre-match Elo from matched_atp_records, in replay order."""
+    with engine.connect() as connection:
+        return pd.read_sql(text("""
+            SELECT matchid, date, winner_name, loser_name, avgw, avgl, comment,
+                   winner_overall_elo, winner_surface_elo, winner_total_matches,
+                   loser_overall_elo, loser_surface_elo, loser_total_matches
+            FROM matched_atp_records
+            WHERE comment IS DISTINCT FROM 'Walkover'
+            ORDER BY date ASC, matchid ASC
+        """), connection)
+
+def recent_match_counts(winner_names, loser_names, days, window=RECENT_FORM_DAYS):
+    """Matches each player played in the window days up to each match (earlier same-day matches included).
+
+    Same window as "Matches Last 6M" in EloEngine.matches_in_window.
+    """
+    pairs = np.column_stack([np.asarray(winner_names, dtype=object), np.asarray(loser_names, dtype=object)])
+    codes, _ = pd.factorize(pairs.ravel())
+    players = codes.reshape(-1, 2).T.ravel()
+    side_days = np.tile(np.asarray(days, dtype=np.int64), 2)
+    match_order = np.tile(np.arange(len(pairs)), 2)
+
+    day_span = int(side_days.max() - side_days.min()) + window + 1
+    keys = players * day_span + (side_days - side_days.min() + window)
+    order = np.lexsort((match_order, keys))
+    sorted_keys = keys[order]
+    counts = np.empty(len(keys), dtype=np.int64)
+    counts[order] = np.arange(len(keys)) - np.searchsorted(sorted_keys, sorted_keys - window, side="right")
+    return counts[:len(pairs)], counts[len(pairs):]
+
+def prepare_backtest(df):
+    """Whole-column inputs for backtest(): odds, model probabilities and eligibility counts per match."""
+    days = to_days(df["date"])
+    winner_recent, loser_recent = recent_match_counts(df["winner_name"], df["loser_name"], days)
+    prepared = {
+        "winner_odds": df["avgw"].to_numpy(dtype=float),
+        "loser_odds": df["avgl"].to_numpy(dtype=float),
+        "min_recent": np.minimum(winner_recent, loser_recent),
+        "min_career": np.minimum(
+            df["winner_total_matches"].to_numpy(dtype=float), df["loser_total_matches"].to_numpy(dtype=float)
+        ),
+    }
+    for rating, (winner_column, loser_column) in RATING_COLUMNS.items():
+        winner_elo = df[winner_column].to_numpy(dtype=float)
+        loser_elo = df[loser_column].to_numpy(dtype=float)
+        prepared[f"{rating}_probability"] = 1 / (1 + 10 ** ((loser_elo - winner_elo) / 400))
+    return prepared
+
+def backtest(prepared, edge_thresholds=EDGE_THRESHOLDS, eligibility_rules=ELIGIBILITY_RULES):
+    """ROI of betting the side with the larger edge, for every rating, staking, rule and threshold.
+
+    The edge of a side is probability * decimal odds - 1. A match is bet when
+    both players meet the rule's recent and career match minimums and the best
+    edge exceeds the threshold. Returns one row per combination.
+    """
+    edge_thresholds = np.asarray(edge_thresholds, dtype=float)
+    rules = np.asarray(eligibility_rules, dtype=float).reshape(-1, 2)
+    winner_odds, loser_odds = prepared["winner_odds"], prepared["loser_odds"]
+    priced = (winner_odds > 1) & (loser_odds > 1)
+    eligible = (
+        (prepared["min_recent"][None, :] >= rules[:, :1]) & (prepared["min_career"][None, :] >= rules[:, 1:])
+        & priced[None, :]
+    )
+
+    results = []
+    for rating in RATING_COLUMNS:
+        winner_probability = prepared[f"{rating}_probability"]
+        winner_edge = winner_probability * winner_odds - 1
+        loser_edge = (1 - winner_probability) * loser_odds - 1
+        back_winner = winner_edge >= loser_edge
+        edge = np.where(back_winner, winner_edge, loser_edge)
+        odds = np.where(back_winner, winner_odds, loser_odds)
+        valid = eligible & ~np.isnan(edge)[None, :]
+        edge = np.nan_to_num(edge, nan=-np.inf)
+
+        # (rule, threshold, match)
+        bets = valid[:, None, :] & (edge[None, None, :] > edge_thresholds[None, :, None])
+        num_bets = bets.sum(axis=2)
+        for staking in STAKING:
+            if staking == "flat":
+                stake = np.ones(len(edge))
+            else:
+                stake = KELLY_FRACTION * np.maximum(edge, 0) / np.where(priced, odds - 1, 1)
+                stake = np.where(priced & np.isfinite(stake), stake, 0.0)
+            pnl = np.where(back_winner, stake * (odds - 1), -stake)
+            pnl = np.where(priced & np.isfinite(pnl), pnl, 0.0)
+            staked = bets @ stake
+            profit = bets @ pnl
+            for rule_index, (min_recent, min_career) in enumerate(rules.astype(int).tolist()):
+                for threshold_index, threshold in enumerate(edge_thresholds.tolist()):
+                    total_staked = staked[rule_index, threshold_index]
+                    results.append([
+                        rating, staking, min_recent, min_career, threshold,
+                        int(num_bets[rule_index, threshold_index]), total_staked,
+                        profit[rule_index, threshold_index],
+                        profit[rule_index, threshold_index] / total_staked if total_staked else 0.0,
+                    ])
+    return pd.DataFrame(results, columns=[
+        "rating", "staking", "min_recent", "min_career", "edge_threshold", "bets", "staked", "profit", "roi",
+    ])
+
+if __name__ == "__main__":
+    print("Loading matches from database...")
+    engine = get_engine()
+    df = load_backtest_matches(engine)
+    # Unrated matches stay in so they count towards recent matches; their NaN edges are never bet
+    print(f"Loaded {len(df)} matches ({df['winner_overall_elo'].notna().sum()} rated).")
+
+    start = time.perf_counter()
+    results = backtest(prepare_backtest(df))
+    elapsed = time.perf_counter() - start
+    results.to_csv(RESULTS_FILE, index=False)
+    print(f"Evaluated {len(results)} strategies in {elapsed:.2f}s.")
+    print(results.sort_values("roi", ascending=False).head(10).to_string(index=False))
+    print(f"✅ Backtest results written to {RESULTS_FILE}.")
@@ -0,0 +1,70 @@
+# Checks that the conflict-free batch replay (elo_batches.py) gives results
+# identical to the sequential EloEngine loop, then reports how the tennis data
+# splits into batches and the throughput of each replay path.
+import sys
+import os
+
+# Add the project root directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import time
+from bench_elo_kernel import (
+    SYNTHETIC_MATCHES, SYNTHETIC_PLAYERS, THROUGHPUT_MATCHES, THROUGHPUT_PLAYERS,
+    differences, replay, synthetic_stream, tennis_stream,
+)
+from elo_batches import schedule_batches
+from elo_engine import HAVE_NUMBA
+
+CONFIGURATIONS = {
+    "running": {},
+    "ratings": {"round_blend": False, "record_post_match_elo": True},
+    "fast avg faced": {"avg_elo_faced_mode": "fast"},
+}
+
+def matches_per_second(stream, **engine_options):
+    start = time.perf_counter()
+    replay(stream, **engine_options)
+    return len(stream[1]) / (time.perf_counter() - start)
+
+if __name__ == "__main__":
+    streams = {"tennis_all.csv": tennis_stream(), "synthetic": synthetic_stream(SYNTHETIC_PLAYERS, SYNTHETIC_MATCHES)}
+    failed = False
+    for stream_name, stream in streams.items():
+        report_day = int(stream[3][-1]) + 30
+        for configuration, options in CONFIGURATIONS.items():
+            for chunks in (1, 37):
+                found = differences(
+                    replay(stream, False, chunks, **options),
+                    replay(stream, False, chunks, batched=True, **options),
+                    report_day,
+                )
+                label = f"{stream_name}, {configuration}, {chunks} chunk(s)"
+                if found:
+                    failed = True
+                    print(f"❌ {label}: paths differ in {', '.join(found)}")
+                else:
+                    print(f"✅ {label}: identical")
+    if failed:
+        exit(1)
+
+    if HAVE_NUMBA:
+        replay(synthetic_stream(4, 100), use_numba=True)  # Compile / load the kernel before timing
+    for stream_name, stream in (
+        ("tennis_all.csv", streams["tennis_all.csv"]),
+        ("synthetic", synthetic_stream(THROUGHPUT_PLAYERS, THROUGHPUT_MATCHES, seed=1)),
+    ):
+        num_matches = len(stream[1])
+        num_batches = int(schedule_batches(stream[1], stream[2]).max()) + 1
+        python_rate = matches_per_second(stream, use_numba=False)
+        batched_rate = matches_per_second(stream, use_numba=False, batched=True)
+        print(
+            f"{stream_name} ({num_matches} matches): {num_batches} batches, "
+            f"{num_matches / num_batches:.1f} matches per batch on average"
+        )
+        print(
+            f"  pure Python {python_rate:,.0f} matches/s, "
+            f"batched NumPy {batched_rate:,.0f} matches/s ({batched_rate / python_rate:.1f}x)"
+        )
+        if HAVE_NUMBA:
+            numba_rate = matches_per_second(stream, use_numba=True)
+            print(f"  Numba kernel {numba_rate:,.0f} matches/s ({numba_rate / python_rate:.1f}x)")
@@ -0,0 +1,223 @@
+# Compares the array-backed EloEngine against the original iterrows replay from
+# create_running_elos.py on tennis_all.csv: checks the pre-match values match and
+# checks the speedup of the default engine path (the Numba kernel) against the
+# 10x target. The pure-Python loop (use_numba=False) is timed for reference.
+import sys
+import os
+
+# Add the project root directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import math
+import time
+import pandas as pd
+from elo_engine import (
+    HAVE_NUMBA, EloEngine, PRE_MATCH_COLUMNS, INITIAL_RATING, DECAY_THRESHOLD_DAYS, DECAY_RATE,
+    SURFACE_TYPES, K_BASE, K_MIN, K_MAX, MATCH_HISTORY_LIMIT, encode_surfaces, to_days,
+)
+
+CSV_FILE = "tennis_all.csv"
+TARGET_SPEEDUP = 10  # Required speedup over the iterrows replay
+ENGINE_REPEATS = 5  # Engine replays are short; report the best of several
+
+def load_matches():
+    """Load tennis_all.csv with the column names used in matched_atp_records."""
+    df = pd.read_csv(CSV_FILE)
+    df = df.rename(columns={
+        "Date": "date", "Surface": "surface", "Winner": "winner_name",
+        "Loser": "loser_name", "Comment": "comment",
+    })
+    df["date"] = pd.to_datetime(df["date"], dayfirst=True)
+    df = df.sort_values(by=["date"], kind="stable").reset_index(drop=True)
+    df["matchid"] = df.index
+    return df
+
+# -------------------------
+# ORIGINAL IMPLEMENTATION
+# -------------------------
+def legacy_replay(df_matches):
+    """The name-keyed dict replay create_running_elos.py used before EloEngine."""
+    player_ratings = {}
+    player_surface_ratings = {surface: {} for surface in SURFACE_TYPES}
+    player_last_match = {}
+    player_match_history = {}
+
+    def get_or_create_player(player_name, surface, match_date):
+        if player_name not in player_ratings:
+            player_ratings[player_name] = INITIAL_RATING
+            player_last_match[player_name] = match_date
+            player_match_history[player_name] = []
+        if player_name not in player_surface_ratings[surface]:
+            player_surface_ratings[surface][player_name] = INITIAL_RATING
+        return player_ratings[player_name], player_surface_ratings[surface][player_name]
+
+    def expected_score(rating_a, rating_b):
+        return 1 / (1 + math.pow(10, (rating_b - rating_a) / 400))
+
+    def apply_rating_decay(player, match_date):
+        if player in player_last_match:
+            days_inactive = (match_date - player_last_match[player]).days
+            if days_inactive > DECAY_THRESHOLD_DAYS:
+                months_inactive = days_inactive / 30
+                decay_factor = DECAY_RATE ** months_inactive
+                player_ratings[player] *= decay_factor
+                for surface in SURFACE_TYPES:
+                    if player in player_surface_ratings[surface]:
+                        player_surface_ratings[surface][player] *= decay_factor
+
+    def calculate_dynamic_k(player):
+        matches_played = len(player_match_history.get(player, []))
+        return max(K_MIN, min(K_MAX, K_BASE * (1 / (1 + 0.1 * matches_played))))
+
+    def calculate_weighted_avg_elo_faced(player):
+        if not player_match_history[player]:
+            return 0
+        decay_factor = 0.9
+        weighted_sum = 0
+        total_weight = 0
+        weight = 1
+        recent_matches = list(reversed(player_match_history[player]))[:50]
+        for match in recent_matches:
+            weighted_sum += match[1] * weight
+            total_weight += weight
+            weight *= decay_factor
+        return round(weighted_sum / total_weight, 2) if total_weight > 0 else 0
+
+    def calculate_log_surface_weighting(overall_elo, surface_elo, total_matches, surface_matches):
+        if total_matches == 0:
+            return overall_elo
+        surface_weight = math.log(1 + surface_matches) / math.log(1 + total_matches)
+        return round(surface_weight * surface_elo + (1 - surface_weight) * overall_elo, 2)
+
+    updated_rows = []
+    for _, row in df_matches.iterrows():
+        match_date = row["date"]
+        surface = row["surface"]
+        winner = row["winner_name"]
+        loser = row["loser_name"]
+        match_id = row["matchid"]
+        comment = row["comment"]
+
+        if surface not in SURFACE_TYPES:
+            continue
+        if comment == "Walkover":
+            continue
+
+        get_or_create_player(winner, surface, match_date)
+        get_or_create_player(loser, surface, match_date)
+        apply_rating_decay(winner, match_date)
+        apply_rating_decay(loser, match_date)
+
+        winner_overall_elo = player_ratings[winner]
+        loser_overall_elo = player_ratings[loser]
+        winner_surface_elo = player_surface_ratings[surface][winner]
+        loser_surface_elo = player_surface_ratings[surface][loser]
+
+        total_matches_winner = len(player_match_history[winner])
+        total_matches_loser = len(player_match_history[loser])
+        surface_matches_winner = sum(1 for match in player_match_history[winner] if match[2] == surface)
+        surface_matches_loser = sum(1 for match in player_match_history[loser] if match[2] == surface)
+
+        winner_blended_elo = calculate_log_surface_weighting(
+            winner_overall_elo, winner_surface_elo, total_matches_winner, surface_matches_winner
+        )
+        loser_blended_elo = calculate_log_surface_weighting(
+            loser_overall_elo, loser_surface_elo, total_matches_loser, surface_matches_loser
+        )
+        winner_avg_elo_faced = calculate_weighted_avg_elo_faced(winner)
+        loser_avg_elo_faced = calculate_weighted_avg_elo_faced(loser)
+
+        K_factor_winner = calculate_dynamic_k(winner)
+        K_factor_loser = calculate_dynamic_k(loser)
+        if comment == "Retired":
+            K_factor_winner *= 0.5
+            K_factor_loser *= 0.5
+
+        expected_winner = expected_score(winner_blended_elo, loser_blended_elo)
+        expected_loser = 1 - expected_winner
+
+        updated_rows.append((
+            match_id,
+            round(winner_overall_elo, 2),
+            round(winner_surface_elo, 2),
+            total_matches_winner,
+            winner_avg_elo_faced,
+            round(loser_overall_elo, 2),
+            round(loser_surface_elo, 2),
+            total_matches_loser,
+            loser_avg_elo_faced
+        ))
+
+        player_ratings[winner] += K_factor_winner * (1 - expected_winner)
+        player_ratings[loser] += K_factor_loser * (0 - expected_loser)
+        player_surface_ratings[surface][winner] += K_factor_winner * (1 - expected_winner)
+        player_surface_ratings[surface][loser] += K_factor_loser * (0 - expected_loser)
+
+        player_last_match[winner] = match_date
+        player_last_match[loser] = match_date
+        player_match_history[winner].append((loser, loser_overall_elo, surface, 1))
+        player_match_history[loser].append((winner, winner_overall_elo, surface, 0))
+        player_match_history[winner] = player_match_history[winner][-MATCH_HISTORY_LIMIT:]
+        player_match_history[loser] = player_match_history[loser][-MATCH_HISTORY_LIMIT:]
+    return updated_rows
+
+# -------------------------
+# ENGINE IMPLEMENTATION
+# -------------------------
+def engine_replay(df_matches, use_numba=True):
+    """The EloEngine path used by create_running_elos.py, including encoding."""
+    df_matches = df_matches[
+        df_matches["surface"].isin(SURFACE_TYPES) & (df_matches["comment"] != "Walkover")
+    ]
+    elo = EloEngine(use_numba=use_numba)
+    winner_ids, loser_ids = elo.encode_match_players(df_matches["winner_name"], df_matches["loser_name"])
+    pre_match = elo.process(
+        winner_ids,
+        loser_ids,
+        to_days(df_matches["date"]),
+        encode_surfaces(df_matches["surface"]),
+        (df_matches["comment"] == "Retired").to_numpy(),
+    )
+    return list(zip(
+        df_matches["matchid"].tolist(),
+        *(pre_match[column].tolist() for column in PRE_MATCH_COLUMNS)
+    ))
+
+def time_call(function, *args, repeats=1):
+    """Result of function(*args) and its best time over repeats calls."""
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function(*args)
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+if __name__ == "__main__":
+    df = load_matches()
+    print(f"Loaded {len(df)} matches from {CSV_FILE}.")
+
+    legacy_rows, legacy_seconds = time_call(legacy_replay, df)
+    print(f"iterrows replay: {legacy_seconds:.3f}s")
+
+    if not HAVE_NUMBA:
+        print("❌ Numba is not installed (pip3 install numba); the engine replay needs it.")
+        exit(1)
+    # The first call compiles the kernel; time it separately from the replay
+    _, compile_seconds = time_call(engine_replay, df.head(100))
+    print(f"Numba kernel compile: {compile_seconds:.3f}s (once per process)")
+
+    timings = {}
+    for label, use_numba in (("EloEngine replay", True), ("EloEngine Python loop (use_numba=False)", False)):
+        engine_rows, timings[label] = time_call(engine_replay, df, use_numba, repeats=ENGINE_REPEATS)
+        mismatches = sum(1 for a, b in zip(legacy_rows, engine_rows) if a != b)
+        if len(legacy_rows) != len(engine_rows) or mismatches:
+            print(f"❌ {label}: pre-match values differ on {mismatches} of {len(legacy_rows)} matches.")
+            exit(1)
+        print(f"{label}: {timings[label]:.3f}s ({legacy_seconds / timings[label]:.1f}x faster)")
+    print(f"✅ Pre-match values identical for {len(engine_rows)} matches.")
+
+    speedup = legacy_seconds / timings["EloEngine replay"]
+    if speedup < TARGET_SPEEDUP:
+        print(f"❌ EloEngine replay is {speedup:.1f}x faster, below the {TARGET_SPEEDUP}x target.")
+        exit(1)
+    print(f"✅ EloEngine replay is {speedup:.1f}x faster (target {TARGET_SPEEDUP}x).")
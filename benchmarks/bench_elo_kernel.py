@@ -0,0 +1,137 @@
+# Checks that the Numba replay kernel and the pure-Python EloEngine loop give
+# identical results, then reports throughput in matches per second for each.
+# Parity covers the engine configurations (including ranked opponents), replays split into chunks (so
+# history pointers reach back into earlier batches) and a synthetic stream long
+# enough to fill and wrap the match history.
+import sys
+import os
+
+# Add the project root directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import time
+import numpy as np
+from bench_elo_engine import load_matches
+from elo_engine import EloEngine, HAVE_NUMBA, PRE_MATCH_COLUMNS, SURFACE_TYPES, encode_surfaces, to_days
+
+SYNTHETIC_PLAYERS = 12
+SYNTHETIC_MATCHES = 30_000  # About 5000 matches per player, past MATCH_HISTORY_LIMIT
+THROUGHPUT_PLAYERS = 2_000
+THROUGHPUT_MATCHES = 500_000
+
+STATE_ARRAYS = [
+    "ratings", "surface_ratings", "last_match", "match_counts", "surface_match_counts",
+    "leaderboard_counts", "faced_sums", "faced_weights",
+]
+
+def tennis_stream():
+    df = load_matches()
+    df = df[df["surface"].isin(SURFACE_TYPES) & (df["comment"] != "Walkover")]
+    elo = EloEngine()
+    winners, losers = elo.encode_match_players(df["winner_name"], df["loser_name"])
+    return (
+        elo.player_names, winners, losers, to_days(df["date"]),
+        encode_surfaces(df["surface"]), (df["comment"] == "Retired").to_numpy(),
+    )
+
+def synthetic_stream(num_players, num_matches, seed=0):
+    rng = np.random.default_rng(seed)
+    winners = rng.integers(0, num_players, num_matches)
+    losers = (winners + rng.integers(1, num_players, num_matches)) % num_players
+    days = np.cumsum(rng.integers(0, 3, num_matches)) + 16_000
+    days[num_matches // 2:] += 400  # A long break so decay kicks in
+    surfaces = rng.integers(0, len(SURFACE_TYPES), num_matches)
+    retired = rng.random(num_matches) < 0.03
+    names = [f"Player {player}" for player in range(num_players)]
+    return names, winners, losers, days, surfaces, retired
+
+def replay(stream, use_numba, chunks=1, **engine_options):
+    names, winners, losers, days, surfaces, retired = stream
+    elo = EloEngine(use_numba=use_numba, record_events=True, **engine_options)
+    elo.encode_players(names)
+    parts = []
+    for rows in np.array_split(np.arange(len(winners)), chunks):
+        parts.append(elo.process(winners[rows], losers[rows], days[rows], surfaces[rows], retired[rows]))
+    pre_match = {
+        column: np.concatenate([part[column] for part in parts])
+        for column in PRE_MATCH_COLUMNS + ["expected_winner"]
+    }
+    return elo, pre_match
+
+def differences(python_run, numba_run, report_day):
+    (python_elo, python_pre_match), (numba_elo, numba_pre_match) = python_run, numba_run
+    found = [column for column in python_pre_match
+             if not np.array_equal(python_pre_match[column], numba_pre_match[column])]
+    found += [name for name in STATE_ARRAYS
+              if not np.array_equal(getattr(python_elo, name), getattr(numba_elo, name), equal_nan=True)]
+    for name, python_values, numba_values in zip(
+        ["history_lengths", "history"], python_elo.match_history.to_arrays(), numba_elo.match_history.to_arrays()
+    ):
+        if not np.array_equal(python_values, numba_values):
+            found.append(name)
+    if python_elo.match_days != numba_elo.match_days:
+        found.append("match_days")
+    if python_elo.rank_opponents and (
+        python_elo.rank_index.sorted_ratings != numba_elo.rank_index.sorted_ratings
+        or python_elo.rank_index.entries != numba_elo.rank_index.entries
+        or list(python_elo.rank_index.expiry) != list(numba_elo.rank_index.expiry)
+    ):
+        found.append("rank_index")
+    for name, python_values, numba_values in zip(
+        ["event_players", "event_days", "event_ratings", "event_surface_ratings"],
+        python_elo.rating_event_arrays(), numba_elo.rating_event_arrays(),
+    ):
+        if not np.array_equal(python_values, numba_values, equal_nan=True):
+            found.append(name)
+    if not python_elo.rating_report(report_day).equals(numba_elo.rating_report(report_day)):
+        found.append("rating_report")
+    return found
+
+def matches_per_second(stream, use_numba):
+    start = time.perf_counter()
+    replay(stream, use_numba)
+    return len(stream[1]) / (time.perf_counter() - start)
+
+if __name__ == "__main__":
+    if not HAVE_NUMBA:
+        print("Numba is not installed; only the pure-Python path is available.")
+        exit(0)
+
+    start = time.perf_counter()
+    replay(synthetic_stream(4, 100), use_numba=True)
+    print(f"Kernel compile / cache load: {time.perf_counter() - start:.2f}s")
+
+    streams = {"tennis_all.csv": tennis_stream(), "synthetic": synthetic_stream(SYNTHETIC_PLAYERS, SYNTHETIC_MATCHES)}
+    configurations = {
+        "running": {},
+        "ratings": {"round_blend": False, "record_post_match_elo": True},
+        "fast avg faced": {"avg_elo_faced_mode": "fast"},
+        "ranked opponents": {"round_blend": False, "record_post_match_elo": True, "rank_opponents": True},
+    }
+    failed = False
+    for stream_name, stream in streams.items():
+        report_day = int(stream[3][-1]) + 30
+        for configuration, options in configurations.items():
+            for chunks in (1, 37):
+                found = differences(
+                    replay(stream, False, chunks, **options), replay(stream, True, chunks, **options), report_day
+                )
+                label = f"{stream_name}, {configuration}, {chunks} chunk(s)"
+                if found:
+                    failed = True
+                    print(f"❌ {label}: paths differ in {', '.join(found)}")
+                else:
+                    print(f"✅ {label}: identical")
+    if failed:
+        exit(1)
+
+    for stream_name, stream in (
+        ("tennis_all.csv", streams["tennis_all.csv"]),
+        ("synthetic", synthetic_stream(THROUGHPUT_PLAYERS, THROUGHPUT_MATCHES, seed=1)),
+    ):
+        python_rate = matches_per_second(stream, use_numba=False)
+        numba_rate = matches_per_second(stream, use_numba=True)
+        print(
+            f"{stream_name} ({len(stream[1])} matches): pure Python {python_rate:,.0f} matches/s, "
+            f"Numba {numba_rate:,.0f} matches/s ({numba_rate / python_rate:.1f}x)"
+        )
@@ -0,0 +1,67 @@
+# Measures the memory used by the per-player match history on tennis_all.csv:
+# the original dict of (opponent name, elo, surface name, won) tuple lists, trimmed
+# with a slice copy after every match, against MatchHistoryStore ring buffers.
+import sys
+import os
+
+# Add the project root directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import tracemalloc
+from bench_elo_engine import load_matches
+from elo_engine import EloEngine, MATCH_HISTORY_LIMIT, SURFACE_TYPES, SURFACE_CODES
+from match_history import MatchHistoryStore
+
+def tuple_history(matches):
+    """Build the history the way the scripts did before MatchHistoryStore."""
+    player_match_history = {}
+    for winner, loser, loser_elo, winner_elo, surface in matches:
+        player_match_history.setdefault(winner, [])
+        player_match_history.setdefault(loser, [])
+        player_match_history[winner].append((loser, loser_elo, surface, 1))
+        player_match_history[loser].append((winner, winner_elo, surface, 0))
+        player_match_history[winner] = player_match_history[winner][-MATCH_HISTORY_LIMIT:]
+        player_match_history[loser] = player_match_history[loser][-MATCH_HISTORY_LIMIT:]
+    return player_match_history
+
+def ring_history(matches, player_index):
+    """Build the same history in MatchHistoryStore with integer ids and surface codes."""
+    store = MatchHistoryStore(MATCH_HISTORY_LIMIT)
+    store.add_players(len(player_index))
+    for winner, loser, loser_elo, winner_elo, surface in matches:
+        winner_id = player_index[winner]
+        loser_id = player_index[loser]
+        surface_code = SURFACE_CODES[surface]
+        store.append(winner_id, loser_id, loser_elo, surface_code, 1)
+        store.append(loser_id, winner_id, winner_elo, surface_code, 0)
+    return store
+
+def measure(function, *args):
+    """Return (peak, retained) bytes allocated while building a history."""
+    tracemalloc.start()
+    result = function(*args)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return peak, retained
+
+if __name__ == "__main__":
+    df = load_matches()
+    df = df[df["surface"].isin(SURFACE_TYPES) & (df["comment"] != "Walkover")]
+    elo = EloEngine()
+    winner_ids, loser_ids = elo.encode_match_players(df["winner_name"], df["loser_name"])
+    # Opponent ratings are fresh floats per match, as they were in the replay
+    matches = list(zip(
+        df["winner_name"].tolist(),
+        df["loser_name"].tolist(),
+        (df["matchid"] * 0.5 + 1000.25).tolist(),
+        (df["matchid"] * 0.25 + 1000.75).tolist(),
+        df["surface"].tolist(),
+    ))
+    print(f"{len(matches)} matches, {elo.num_players} players")
+
+    tuple_peak, tuple_retained = measure(tuple_history, matches)
+    ring_peak, ring_retained = measure(ring_history, matches, elo.player_index)
+    print(f"tuple lists:  peak {tuple_peak / 1e6:.2f} MB, retained {tuple_retained / 1e6:.2f} MB")
+    print(f"ring buffers: peak {ring_peak / 1e6:.2f} MB, retained {ring_retained / 1e6:.2f} MB")
+    print(f"peak reduction: {tuple_peak / ring_peak:.1f}x")
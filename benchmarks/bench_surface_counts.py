@@ -0,0 +1,68 @@
+# Shows that the per-match cost of the surface match counts stays flat as careers
+# get longer. A small synthetic tour plays the same players against each other so
+# careers grow well past MATCH_HISTORY_LIMIT; for each block of matches we time the
+# old history scan, the running counter lookup and a full EloEngine update.
+import sys
+import os
+
+# Add the project root directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import time
+import numpy as np
+from elo_engine import EloEngine, MATCH_HISTORY_LIMIT, SURFACE_TYPES
+
+NUM_PLAYERS = 8
+BLOCK_SIZE = 2000
+NUM_BLOCKS = 8
+
+def synthetic_block(rng, first_day):
+    """A block of random matches between NUM_PLAYERS players, one match per day."""
+    winners = rng.integers(0, NUM_PLAYERS, BLOCK_SIZE)
+    losers = (winners + rng.integers(1, NUM_PLAYERS, BLOCK_SIZE)) % NUM_PLAYERS
+    days = first_day + np.arange(BLOCK_SIZE)
+    surfaces = rng.integers(0, len(SURFACE_TYPES), BLOCK_SIZE)
+    retired = np.zeros(BLOCK_SIZE, dtype=bool)
+    return winners, losers, days, surfaces, retired
+
+def time_scan(elo, winners, losers, surfaces):
+    """Time counting surface matches by scanning each player's match history as a tuple list."""
+    history = [elo.match_history.entries(player).tolist() for player in range(NUM_PLAYERS)]
+    start = time.perf_counter()
+    for winner, loser, surface in zip(winners.tolist(), losers.tolist(), surfaces.tolist()):
+        sum(1 for match in history[winner] if match[2] == surface)
+        sum(1 for match in history[loser] if match[2] == surface)
+    return time.perf_counter() - start
+
+def time_counters(elo, winners, losers, surfaces):
+    """Time reading the same counts from the running per-surface counters."""
+    start = time.perf_counter()
+    for winner, loser, surface in zip(winners.tolist(), losers.tolist(), surfaces.tolist()):
+        int(elo.surface_match_counts[winner, surface])
+        int(elo.surface_match_counts[loser, surface])
+    return time.perf_counter() - start
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    # Compile / load the replay kernel on a throwaway engine so the first block isn't timed with it
+    warm_up = EloEngine()
+    warm_up.encode_players([f"Player {i}" for i in range(NUM_PLAYERS)])
+    warm_up.process(*synthetic_block(np.random.default_rng(1), 0))
+
+    elo = EloEngine()
+    elo.encode_players([f"Player {i}" for i in range(NUM_PLAYERS)])
+
+    print(f"History limit: {MATCH_HISTORY_LIMIT} matches per player")
+    print(f"{'career':>8} {'scan us/match':>14} {'counter us/match':>17} {'engine us/match':>16}")
+    for block in range(NUM_BLOCKS):
+        winners, losers, days, surfaces, retired = synthetic_block(rng, block * BLOCK_SIZE)
+        career = int(elo.match_counts.mean())
+        scan_seconds = time_scan(elo, winners, losers, surfaces)
+        counter_seconds = time_counters(elo, winners, losers, surfaces)
+        start = time.perf_counter()
+        elo.process(winners, losers, days, surfaces, retired)
+        engine_seconds = time.perf_counter() - start
+        print(
+            f"{career:>8} {scan_seconds / BLOCK_SIZE * 1e6:>14.2f} "
+            f"{counter_seconds / BLOCK_SIZE * 1e6:>17.2f} {engine_seconds / BLOCK_SIZE * 1e6:>16.2f}"
+        )
@@ -63,7 +63,11 @@ CREATE TABLE {TABLE_NAME} (
     loser_overall_elo FLOAT,
     loser_surface_elo FLOAT,
     loser_total_matches INT,
-    loser_avg_elo_faced FLOAT
+    loser_avg_elo_faced FLOAT,
+    winner_glicko_rating FLOAT,
+    winner_glicko_rd FLOAT,
+    loser_glicko_rating FLOAT,
+    loser_glicko_rd FLOAT
 );
 """
 print(f"Creating table '{TABLE_NAME}'...")
@@ -1,7 +1,20 @@
+import argparse
+import glob
+import os
+import tempfile
+import numpy as np
 import pandas as pd
-import math
-from datetime import datetime, timedelta
 from sqlalchemy import create_engine, text
+from db_connect import bulk_update
+from elo_metrics import PredictionMetrics
+from elo_engine import (
+    ELO_CHECKPOINT_FILE, EloEngine, PRE_MATCH_COLUMNS, SURFACE_TYPES, encode_surfaces, from_day, to_days,
+)
+from glicko import GLICKO_PRE_MATCH_COLUMNS, GlickoModel, rating_period_start, rating_periods
+from rating_runs import (
+    RUN_COLUMNS, RUN_INPUT_COLUMNS, config_hash, create_run_tables, input_digests, input_hash, latest_run_id,
+    load_run, rating_run_config, stored_input_hash, store_run,
+)
 
 # -------------------------
 # CONFIGURATION
@@ -11,17 +24,36 @@ DB_USER = "seanthompson"
 DB_PASS = ""  # Add password if necessary
 DB_HOST = "localhost"
 DB_PORT = "5432"
+ELO_CHECKPOINT_DIR = "elo_checkpoints"  # Engine state at the end of every month, for --replay-from
+# Monthly states leave out the rating event log and read it back from ELO_CHECKPOINT_FILE
 
-# Elo Constants
-INITIAL_RATING = 1500
-DECAY_THRESHOLD_DAYS = 180
-DECAY_RATE = 0.995
-REMOVAL_THRESHOLD_DAYS = 730
-SURFACE_TYPES = ["Hard", "Clay", "Grass"]
-K_BASE = 32
-K_MIN = 12
-K_MAX = 50
-MATCH_HISTORY_LIMIT = 1000
+def monthly_checkpoint_path(month, directory=ELO_CHECKPOINT_DIR):
+    return os.path.join(directory, f"elo_{month}.npz")
+
+def rate_glicko(glicko, df_rows):
+    """Rate whole rating periods of matches with glicko; pre-match values indexed by matchid."""
+    winner_ids, loser_ids = glicko.encode_match_players(df_rows["winner_name"], df_rows["loser_name"])
+    pre_match = glicko.process(
+        winner_ids, loser_ids, rating_periods(to_days(df_rows["date"])), (df_rows["comment"] == "Retired").to_numpy()
+    )
+    return pd.DataFrame(pre_match, index=df_rows["matchid"].to_numpy())
+
+def saved_checkpoint_months():
+    return sorted(os.path.basename(path)[len("elo_"):-len(".npz")]
+                  for path in glob.glob(monthly_checkpoint_path("*")))
+
+parser = argparse.ArgumentParser(description="Compute pre-match Elo ratings for matched_atp_records.")
+mode = parser.add_mutually_exclusive_group()
+mode.add_argument(
+    "--incremental", action="store_true",
+    help=f"Resume from {ELO_CHECKPOINT_FILE} and only process matches newer than the last run",
+)
+mode.add_argument(
+    "--replay-from", metavar="YYYY-MM-DD",
+    help=f"Re-rate matches from this date on, resuming from the last monthly checkpoint in {ELO_CHECKPOINT_DIR}/ "
+         "before it (use after correcting or adding matches dated on or after it)",
+)
+args = parser.parse_args()
 
 # -------------------------
 # CONNECT TO POSTGRESQL
@@ -29,195 +61,207 @@ MATCH_HISTORY_LIMIT = 1000
 print("Connecting to the database...")
 engine = create_engine(f"postgresql://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}")
 
+# -------------------------
+# CHOOSE WHERE TO RESUME
+# -------------------------
+# Every run is also stored under a hash of its configuration (rating_runs.py).
+# The checkpoints hold the state of the last stored run, so resuming only
+# makes sense if that run has this configuration.
+create_run_tables(engine)
+elo = EloEngine(metrics=PredictionMetrics(), record_events=True)
+run_config = rating_run_config(elo)
+run_id = config_hash(run_config)
+stored_hash = stored_input_hash(engine, run_id)
+resume_from = None
+stale_months = []  # Monthly checkpoints replaced by this run, removed once it is stored
+if stored_hash is None or latest_run_id(engine) != run_id:
+    if args.incremental or args.replay_from:
+        print(f"The checkpoints are not from run {run_id} (this configuration), running a full replay.")
+elif args.incremental and os.path.exists(ELO_CHECKPOINT_FILE):
+    resume_from = ELO_CHECKPOINT_FILE
+elif args.replay_from:
+    replay_month = str(np.datetime64(args.replay_from, "M"))
+    # Later months are replayed below; their states go once the run is stored so none outlive the correction
+    stale_months = [month for month in saved_checkpoint_months() if month >= replay_month]
+    earlier_months = [month for month in saved_checkpoint_months() if month < replay_month]
+    if earlier_months:
+        resume_from = monthly_checkpoint_path(earlier_months[-1])
+
 # -------------------------
 # LOAD MATCHES IN CHRONOLOGICAL ORDER
 # -------------------------
+# Next to the Elo state after its high-water mark, a checkpoint holds the
+# Glicko-2 state before the rating period the high-water mark falls in and the
+# input digest of the matches up to it, so a resumed run only loads the
+# matches from the start of that rating period on. matchid breaks ties within
+# a date so the replay order (and the high-water mark) is the same on every run.
+if resume_from:
+    elo, resume_point = EloEngine.load(resume_from, events_path=ELO_CHECKPOINT_FILE)
+    elo.metrics = PredictionMetrics()
+    with np.load(resume_from) as checkpoint:
+        glicko = GlickoModel.from_checkpoint(checkpoint)
+        glicko_period = int(checkpoint["glicko_period"])
+        digest_before = checkpoint["input_digest"]
+    print(f"Resuming from {resume_from} after {from_day(resume_point[0])} (matchid {resume_point[1]})...")
+    query = text(f"""
+        SELECT {", ".join(RUN_INPUT_COLUMNS)} FROM matched_atp_records
+        WHERE date >= :period_start
+        ORDER BY date ASC, matchid ASC
+    """)
+    params = {"period_start": from_day(rating_period_start(glicko_period))}
+else:
+    if args.incremental or args.replay_from:
+        print("No earlier checkpoint found, running a full replay.")
+    resume_point = None
+    glicko = GlickoModel()
+    digest_before = None
+    query = text(f"SELECT {', '.join(RUN_INPUT_COLUMNS)} FROM matched_atp_records ORDER BY date ASC, matchid ASC")
+    params = {}
+
 print("Loading matches from database...")
 with engine.connect() as connection:
-    df_matches = pd.read_sql(
-        text('SELECT * FROM matched_atp_records ORDER BY date ASC'),
-        connection
+    df_loaded = pd.read_sql(query, connection, params=params)
+loaded_days = to_days(df_loaded["date"])
+if resume_point:
+    # Rows up to the high-water mark are only loaded for the Glicko-2 period it falls in
+    resume_day, resume_match_id = resume_point
+    after_resume = (loaded_days > resume_day) | (
+        (loaded_days == resume_day) & (df_loaded["matchid"].to_numpy() > resume_match_id)
     )
-
+    replace_after = (from_day(resume_day), resume_match_id)
+else:
+    after_resume = np.ones(len(df_loaded), dtype=bool)
+    replace_after = None
+df_matches = df_loaded[after_resume]
 print(f"Loaded {len(df_matches)} matches from database.")
 
 # -------------------------
-# INITIALIZE ELO DATA
-# -------------------------
-player_ratings = {}
-player_surface_ratings = {surface: {} for surface in SURFACE_TYPES}
-player_last_match = {}
-player_match_history = {}
-
-def get_or_create_player(player_name, surface, match_date):
-    """Retrieve or initialize player's Elo ratings."""
-    if player_name not in player_ratings:
-        player_ratings[player_name] = INITIAL_RATING
-        player_last_match[player_name] = match_date
-        player_match_history[player_name] = []
-    if player_name not in player_surface_ratings[surface]:
-        player_surface_ratings[surface][player_name] = INITIAL_RATING
-    return player_ratings[player_name], player_surface_ratings[surface][player_name]
-
-def expected_score(rating_a, rating_b):
-    """Calculate expected probability of Player A beating Player B."""
-    return 1 / (1 + math.pow(10, (rating_b - rating_a) / 400))
-
-def apply_rating_decay(player, match_date):
-    """Apply Elo decay for inactivity."""
-    if player in player_last_match:
-        days_inactive = (match_date - player_last_match[player]).days
-        if days_inactive > DECAY_THRESHOLD_DAYS:
-            months_inactive = days_inactive / 30
-            decay_factor = DECAY_RATE ** months_inactive
-            player_ratings[player] *= decay_factor
-            for surface in SURFACE_TYPES:
-                if player in player_surface_ratings[surface]:
-                    player_surface_ratings[surface][player] *= decay_factor
-
-def calculate_dynamic_k(player):
-    """Compute dynamic K-factor based on matches played."""
-    matches_played = len(player_match_history.get(player, []))
-    return max(K_MIN, min(K_MAX, K_BASE * (1 / (1 + 0.1 * matches_played))))
-
-def calculate_weighted_avg_elo_faced(player):
-    """Compute exponentially weighted average Elo faced."""
-    if not player_match_history[player]:
-        return 0
-    decay_factor = 0.9
-    weighted_sum = 0
-    total_weight = 0
-    weight = 1
-    recent_matches = list(reversed(player_match_history[player]))[:50]  # Last 50 matches
-    for match in recent_matches:
-        weighted_sum += match[1] * weight
-        total_weight += weight
-        weight *= decay_factor
-    return round(weighted_sum / total_weight, 2) if total_weight > 0 else 0
-
-def calculate_log_surface_weighting(overall_elo, surface_elo, total_matches, surface_matches):
-    """Blend overall Elo and surface Elo using logarithmic weighting."""
-    if total_matches == 0:  # Prevent division by zero
-        return overall_elo
-    surface_weight = math.log(1 + surface_matches) / math.log(1 + total_matches)
-    return round(surface_weight * surface_elo + (1 - surface_weight) * overall_elo, 2)
-
-# -------------------------
-# PROCESS MATCHES AND UPDATE ELO
-# -------------------------
-updated_rows = []
-
-for _, row in df_matches.iterrows():
-    match_date = row["date"]
-    surface = row["surface"]
-    winner = row["winner_name"]
-    loser = row["loser_name"]
-    match_id = row["matchid"]
-    comment = row["comment"]  # Get the comment field
-
-    if surface not in SURFACE_TYPES:
-        continue
-    if comment == "Walkover":  # Skip walkovers
-        continue
-
-    # Ensure players exist
-    winner_rating, winner_surface_rating = get_or_create_player(winner, surface, match_date)
-    loser_rating, loser_surface_rating = get_or_create_player(loser, surface, match_date)
-
-    # Apply decay
-    apply_rating_decay(winner, match_date)
-    apply_rating_decay(loser, match_date)
-
-    # Get pre-match ratings
-    winner_overall_elo = player_ratings[winner]
-    loser_overall_elo = player_ratings[loser]
-    winner_surface_elo = player_surface_ratings[surface][winner]
-    loser_surface_elo = player_surface_ratings[surface][loser]
-
-    # Compute pre-match statistics
-    total_matches_winner = len(player_match_history[winner])
-    total_matches_loser = len(player_match_history[loser])
-    surface_matches_winner = sum(1 for match in player_match_history[winner] if match[2] == surface)
-    surface_matches_loser = sum(1 for match in player_match_history[loser] if match[2] == surface)
-
-    winner_blended_elo = calculate_log_surface_weighting(
-        winner_overall_elo, winner_surface_elo, total_matches_winner, surface_matches_winner
-    )
-    loser_blended_elo = calculate_log_surface_weighting(
-        loser_overall_elo, loser_surface_elo, total_matches_loser, surface_matches_loser
+# LOOK UP THE RATING RUN
+# -------------------------
+# If this configuration was already run on the same matches, its stored values
+# are written back instead of recomputing them, and only where
+# matched_atp_records holds something else.
+digests = input_digests(df_matches, digest_before)  # digests[i + 1] covers the input up to row i
+current_input_hash = input_hash(digests[-1])
+if stored_hash == current_input_hash:
+    stored_run = load_run(engine, run_id, replace_after)
+    if latest_run_id(engine) == run_id:
+        # The table was last written by this run; only rows edited since then need restoring
+        after_clause = "WHERE (date, matchid) > (:after_date, :after_match_id)" if replace_after else ""
+        with engine.connect() as connection:
+            current = pd.read_sql(
+                text(f"SELECT matchid, {', '.join(RUN_COLUMNS)} FROM matched_atp_records {after_clause}"),
+                connection, params=dict(zip(["after_date", "after_match_id"], replace_after or ())),
+                index_col="matchid",
+            ).reindex(stored_run.index).round(2)
+        same = (current == stored_run) | (current.isna() & stored_run.isna())
+        stored_run = stored_run[~same.all(axis=1)]
+    if stored_run.empty:
+        print(f"✅ Run {run_id} is unchanged and matched_atp_records already holds its ratings.")
+        exit(0)
+    updated_count = bulk_update(
+        engine, "matched_atp_records", "matchid", RUN_COLUMNS, stored_run.itertuples(index=True, name=None)
     )
+    print(f"✅ Run {run_id} is unchanged; restored its stored ratings ({updated_count} rows).")
+    exit(0)
 
-    winner_avg_elo_faced = calculate_weighted_avg_elo_faced(winner)
-    loser_avg_elo_faced = calculate_weighted_avg_elo_faced(loser)
-
-    # Compute dynamic K-factors
-    K_factor_winner = calculate_dynamic_k(winner)
-    K_factor_loser = calculate_dynamic_k(loser)
-    if comment == "Retired":  # Halve K-factor for retirements
-        K_factor_winner *= 0.5
-        K_factor_loser *= 0.5
-
-    # Expected scores
-    expected_winner = expected_score(winner_blended_elo, loser_blended_elo)
-    expected_loser = 1 - expected_winner
-
-    # Store pre-match results
-    updated_rows.append((
-        match_id, 
-        round(winner_overall_elo, 2), 
-        round(winner_surface_elo, 2), 
-        total_matches_winner, 
-        winner_avg_elo_faced, 
-        round(loser_overall_elo, 2), 
-        round(loser_surface_elo, 2), 
-        total_matches_loser, 
-        loser_avg_elo_faced
-    ))
+if df_matches.empty:
+    print("✅ No new matches to process.")
+    exit(0)
+match_days = loaded_days[after_resume]
+high_water_mark = (int(match_days[-1]), int(df_matches["matchid"].iloc[-1]))
+months = match_days.astype("datetime64[D]").astype("datetime64[M]").astype(str)
+# Last row of each month: the high-water mark of each monthly checkpoint
+month_end_rows = np.flatnonzero(np.r_[months[1:] != months[:-1], True])
+
+# -------------------------
+# PROCESS MATCHES AND UPDATE ELO AND GLICKO-2
+# -------------------------
+# Matches are replayed a month at a time and the engine state is saved after
+# each month, so a correction only replays from the month it falls in. Glicko-2
+# keeps pace one whole rating period at a time: each monthly state holds it up
+# to the period the month ends in. The states are staged next to the published
+# ones and only moved into place once the run is stored.
+rated = (df_matches["surface"].isin(SURFACE_TYPES) & (df_matches["comment"] != "Walkover")).to_numpy()  # Skip walkovers
+df_glicko = df_loaded[df_loaded["surface"].isin(SURFACE_TYPES) & (df_loaded["comment"] != "Walkover")]
+glicko_periods = rating_periods(to_days(df_glicko["date"]))
 
-    # Update ratings post-match
-    player_ratings[winner] += K_factor_winner * (1 - expected_winner)
-    player_ratings[loser] += K_factor_loser * (0 - expected_loser)
-    player_surface_ratings[surface][winner] += K_factor_winner * (1 - expected_winner)
-    player_surface_ratings[surface][loser] += K_factor_loser * (0 - expected_loser)
+os.makedirs(ELO_CHECKPOINT_DIR, exist_ok=True)
+staging_dir = tempfile.mkdtemp(prefix="staging_", dir=ELO_CHECKPOINT_DIR)
+pre_match_parts = []
+glicko_parts = []
+glicko_done = 0
+month_start = 0
+for month_end in month_end_rows.tolist():
+    df_month = df_matches.iloc[month_start:month_end + 1][rated[month_start:month_end + 1]]
+    month_start = month_end + 1
+    winner_ids, loser_ids = elo.encode_match_players(df_month["winner_name"], df_month["loser_name"])
+    pre_match_parts.append(elo.process(
+        winner_ids,
+        loser_ids,
+        to_days(df_month["date"]),
+        encode_surfaces(df_month["surface"]),
+        (df_month["comment"] == "Retired").to_numpy(),  # Halve K-factor for retirements
+    ))
+    glicko_period = int(rating_periods(match_days[month_end]))
+    glicko_end = int(np.searchsorted(glicko_periods, glicko_period, side="left"))
+    glicko_parts.append(rate_glicko(glicko, df_glicko.iloc[glicko_done:glicko_end]))
+    glicko_done = glicko_end
+    elo.save(
+        monthly_checkpoint_path(months[month_end], staging_dir),
+        (int(match_days[month_end]), int(df_matches["matchid"].iloc[month_end])),
+        events=False,
+        extra={**glicko.checkpoint_arrays(), "glicko_period": glicko_period, "input_digest": digests[month_end + 1]},
+    )
+# The last month ends at the high-water mark: its Glicko-2 state goes to the main checkpoint
+checkpoint_extra = {**glicko.checkpoint_arrays(), "glicko_period": glicko_period, "input_digest": digests[-1]}
+glicko_parts.append(rate_glicko(glicko, df_glicko.iloc[glicko_done:]))
+df_matches = df_matches[rated]
+pre_match = {column: np.concatenate([part[column] for part in pre_match_parts]) for column in PRE_MATCH_COLUMNS}
+glicko_pre_match = pd.concat(glicko_parts).loc[df_matches["matchid"].to_numpy()]
+print(f"Processed {len(df_matches)} matches for {elo.num_players} players.")
+print(f"Prediction quality over {elo.metrics.summary()}")
+print(f"Rated {len(df_glicko)} matches for {glicko.num_players} players with Glicko-2.")
 
-    # Update match history and last match date
-    player_last_match[winner] = match_date
-    player_last_match[loser] = match_date
-    player_match_history[winner].append((loser, loser_overall_elo, surface, 1))
-    player_match_history[loser].append((winner, winner_overall_elo, surface, 0))
-    player_match_history[winner] = player_match_history[winner][-MATCH_HISTORY_LIMIT:]
-    player_match_history[loser] = player_match_history[loser][-MATCH_HISTORY_LIMIT:]
+run_values = pd.DataFrame(
+    {
+        "date": df_matches["date"].to_numpy(),
+        **{column: pre_match[column] for column in PRE_MATCH_COLUMNS},
+        **{column: glicko_pre_match[column].round(2).to_numpy() for column in GLICKO_PRE_MATCH_COLUMNS},
+    },
+    index=pd.Index(df_matches["matchid"].to_numpy(), name="matchid"),
+)
 
 # -------------------------
-# UPDATE DATABASE WITH PRE-MATCH ELO
+# UPDATE DATABASE WITH PRE-MATCH ELO AND GLICKO
 # -------------------------
-print("Updating database with pre-match Elo ratings...")
+print("Updating database with pre-match Elo and Glicko-2 ratings...")
 with engine.connect() as connection:
-    for match in updated_rows:
-        query = text("""
-            UPDATE matched_atp_records
-            SET
-                winner_overall_elo = :w_elo,
-                winner_surface_elo = :w_s_elo,
-                winner_total_matches = :w_matches,
-                winner_avg_elo_faced = :w_avg_elo,
-                loser_overall_elo = :l_elo,
-                loser_surface_elo = :l_s_elo,
-                loser_total_matches = :l_matches,
-                loser_avg_elo_faced = :l_avg_elo
-            WHERE matchid = :match_id;
-        """)
-        connection.execute(query, {
-            "match_id": match[0],
-            "w_elo": match[1],
-            "w_s_elo": match[2],
-            "w_matches": match[3],
-            "w_avg_elo": match[4],
-            "l_elo": match[5],
-            "l_s_elo": match[6],
-            "l_matches": match[7],
-            "l_avg_elo": match[8]
-        })
+    # Tables created before the Glicko columns existed get them on first run
+    for column in GLICKO_PRE_MATCH_COLUMNS:
+        connection.execute(text(f"ALTER TABLE matched_atp_records ADD COLUMN IF NOT EXISTS {column} FLOAT"))
     connection.commit()
+updated_count = bulk_update(
+    engine, "matched_atp_records", "matchid", RUN_COLUMNS, run_values[RUN_COLUMNS].itertuples(index=True, name=None)
+)
+print(f"✅ Database updated successfully! ({updated_count} rows)")
+
+# -------------------------
+# STORE THE RATING RUN
+# -------------------------
+# A resumed run keeps its stored values up to the resume point and replaces the rest.
+store_run(engine, run_id, run_config, current_input_hash, run_values, replace_after)
+print(f"✅ Stored run {run_id} ({len(run_values)} rated matches{' after the resume point' if resume_point else ''}).")
 
-print("✅ Database updated successfully!")
\ No newline at end of file
+# Only checkpoint once the pre-match values are committed, so a failed run is
+# simply retried from the previous high-water mark.
+for month in stale_months:
+    os.remove(monthly_checkpoint_path(month))
+for month in months[month_end_rows]:
+    os.replace(monthly_checkpoint_path(month, staging_dir), monthly_checkpoint_path(month))
+os.rmdir(staging_dir)
+elo.save(ELO_CHECKPOINT_FILE, high_water_mark, extra=checkpoint_extra)
+print(
+    f"✅ Saved Elo and Glicko-2 state to {ELO_CHECKPOINT_FILE} "
+    f"and {len(month_end_rows)} monthly states to {ELO_CHECKPOINT_DIR}/."
+)
@@ -1,3 +1,5 @@
+import csv
+import io
 from sqlalchemy import create_engine
 
 # -------------------------
@@ -15,3 +17,45 @@ DB_PORT = "5432"
 def get_engine():
     """Returns a SQLAlchemy engine for the database connection."""
     return create_engine(f"postgresql://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}")
+
+# -------------------------
+# BULK UPDATE FUNCTION
+# -------------------------
+def bulk_update(engine, table_name, key_column, columns, rows):
+    """Update many rows of a table in one transaction.
+
+    rows are (key, value, ...) tuples in the order key_column, *columns. They are
+    streamed into a temporary staging table with COPY and applied with a single
+    UPDATE ... FROM, so the cost is one round trip rather than one per row.
+    Returns the number of rows updated.
+    """
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+
+    staging_table = f"{table_name}_staging"
+    column_list = ", ".join([key_column, *columns])
+    assignments = ", ".join(f"{column} = s.{column}" for column in columns)
+    connection = engine.raw_connection()
+    try:
+        with connection.cursor() as cursor:
+            # Same column types as the target table, dropped at commit
+            cursor.execute(f"""
+                CREATE TEMP TABLE {staging_table} ON COMMIT DROP AS
+                SELECT {column_list} FROM {table_name} WITH NO DATA;
+            """)
+            cursor.copy_expert(f"COPY {staging_table} ({column_list}) FROM STDIN WITH (FORMAT csv)", buffer)
+            cursor.execute(f"""
+                UPDATE {table_name} t
+                SET {assignments}
+                FROM {staging_table} s
+                WHERE t.{key_column} = s.{key_column};
+            """)
+            updated_count = cursor.rowcount
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+    return updated_count
@@ -0,0 +1,162 @@
+# Conflict-free batch replay for EloEngine.process in plain NumPy.
+# A match only reads and writes the state of its two players, so the replay
+# order only has to be kept per player. schedule_batches gives every match the
+# first batch after the previous matches of both its players (level
+# scheduling); no player appears twice in a batch and every batch is updated
+# with whole-array gathers, arithmetic and scatters. The results are identical
+# to the sequential loop: each player still sees their matches in the original
+# order, and the few operations where NumPy and Python round differently
+# (pow and round) are done the Python way.
+#
+# replay_batches takes the same arguments as elo_kernel.replay_kernel.
+import math
+import numpy as np
+from elo_engine import (
+    AVG_ELO_FACED_DECAY, DECAY_THRESHOLD_DAYS, INITIAL_RATING, MATCH_HISTORY_LIMIT, TOP20_ELO, TOP50_ELO,
+    calculate_decay_factor, calculate_dynamic_k,
+)
+from elo_kernel import DROPPED_WEIGHT, round_2_magnitude
+
+# Per-count lookups for the capped match counts, filled by the scalar formulas
+LOG_MATCHES = np.array([math.log(1 + matches) for matches in range(MATCH_HISTORY_LIMIT + 1)])
+K_FACTORS = np.array([float(calculate_dynamic_k(matches)) for matches in range(MATCH_HISTORY_LIMIT + 1)])
+
+def schedule_batches(winners, losers):
+    """Batch index of every match: one past the latest batch either player already appears in."""
+    next_batch = {}
+    batches = np.empty(len(winners), dtype=np.int64)
+    for i, (winner, loser) in enumerate(zip(np.asarray(winners).tolist(), np.asarray(losers).tolist())):
+        batch = max(next_batch.get(winner, 0), next_batch.get(loser, 0))
+        batches[i] = batch
+        next_batch[winner] = next_batch[loser] = batch + 1
+    return batches
+
+def round_2(values):
+    """Python's round(x, 2) over an array (np.round is not correctly rounded), as elo_kernel.round_2."""
+    values = np.asarray(values, dtype=float)
+    with np.errstate(invalid="ignore"):
+        rounded = np.copysign(round_2_magnitude(np.abs(values)), values)
+    return np.where(np.isfinite(values), rounded, values)
+
+def _count_leaderboard_matches(leaderboard_counts, players, opponent_elos, won, change):
+    """Vectorized EloEngine._count_leaderboard_match for distinct players."""
+    top50 = (opponent_elos >= TOP50_ELO) * change
+    top20 = (opponent_elos >= TOP20_ELO) * change
+    leaderboard_counts[players, 0] += top20
+    leaderboard_counts[players, 1] += top20 * won
+    leaderboard_counts[players, 2] += top50
+    leaderboard_counts[players, 3] += top50 * won
+
+def replay_batches(
+    winners, losers, days, surfaces, retired,
+    window_rows, window_elos, evicted_rows, evicted_elos, evicted_surfaces, evicted_won,
+    ratings, surface_ratings, last_match, match_counts, surface_match_counts, leaderboard_counts,
+    faced_sums, faced_weights,
+    round_blend, record_post_match_elo, exact_avg_elo_faced,
+    pre_match, row_opponent_elos, event_ratings, event_surface_ratings,
+    rank_opponents, active_days, live_ratings, rank_state, entry_ratings, entry_days, queue_days, queue_players,
+    evicted_ranks, row_opponent_ranks,
+):
+    """Replay a batch of matches one conflict-free batch at a time (see elo_kernel.replay_kernel).
+
+    EloEngine rejects rank_opponents with batched, so the rank arguments are unused.
+    """
+    batches = schedule_batches(winners, losers)
+    by_batch = np.argsort(batches, kind="stable")
+    batch_starts = np.flatnonzero(np.diff(batches[by_batch])) + 1
+    for matches in np.split(by_batch, batch_starts):
+        count = len(matches)
+        # Both sides of every match: winners first, then losers; all players are distinct
+        players = np.concatenate([winners[matches], losers[matches]])
+        opponents = np.concatenate([losers[matches], winners[matches]])
+        rows = np.concatenate([2 * matches, 2 * matches + 1])
+        won = np.repeat([1, 0], count)
+        match_days = np.concatenate([days[matches], days[matches]])
+        match_surfaces = np.concatenate([surfaces[matches], surfaces[matches]])
+
+        # As EloEngine._prepare_player
+        last_match[players] = np.where(last_match[players] < 0, match_days, last_match[players])
+        surface_elos = surface_ratings[players, match_surfaces]
+        surface_ratings[players, match_surfaces] = np.where(np.isnan(surface_elos), INITIAL_RATING, surface_elos)
+        days_inactive = match_days - last_match[players]
+        decaying = np.flatnonzero(days_inactive > DECAY_THRESHOLD_DAYS)
+        if len(decaying):
+            decay_factors = np.array([calculate_decay_factor(days) for days in days_inactive[decaying].tolist()])
+            ratings[players[decaying]] *= decay_factors
+            surface_ratings[players[decaying]] *= decay_factors[:, None]
+
+        overall_elos = ratings[players]
+        surface_elos = surface_ratings[players, match_surfaces]
+        total_matches = np.minimum(match_counts[players], MATCH_HISTORY_LIMIT)
+        surface_matches = surface_match_counts[players, match_surfaces]
+        surface_weights = LOG_MATCHES[surface_matches] / LOG_MATCHES[np.maximum(total_matches, 1)]
+        blended_elos = np.where(
+            total_matches == 0, overall_elos, surface_weights * surface_elos + (1 - surface_weights) * overall_elos
+        )
+        if round_blend:
+            blended_elos = round_2(blended_elos)
+
+        K_factors = K_FACTORS[total_matches]
+        K_factors = np.where(np.concatenate([retired[matches], retired[matches]]), K_factors * 0.5, K_factors)
+
+        exponents = (blended_elos[count:] - blended_elos[:count]) / 400
+        expected_winner = 1 / (1 + np.array([math.pow(10, exponent) for exponent in exponents.tolist()]))
+        expected_loser = 1 - expected_winner
+
+        faced_weights_before = faced_weights[players]
+        avg_elo_faced = np.divide(
+            faced_sums[players], faced_weights_before,
+            out=np.zeros(2 * count), where=faced_weights_before > 0,
+        )
+        # Rounded once after the last batch
+        pre_match[matches, :8] = np.column_stack([
+            overall_elos[:count], surface_elos[:count], total_matches[:count], avg_elo_faced[:count],
+            overall_elos[count:], surface_elos[count:], total_matches[count:], avg_elo_faced[count:],
+        ])
+        pre_match[matches, 8] = expected_winner
+
+        changes = K_factors * np.concatenate([1 - expected_winner, 0 - expected_loser])
+        ratings[players] = overall_elos + changes
+        surface_ratings[players, match_surfaces] = surface_elos + changes
+        event_ratings[rows] = ratings[players]
+        event_surface_ratings[rows] = surface_ratings[players]
+
+        last_match[players] = match_days
+        match_counts[players] += 1
+        surface_match_counts[players, match_surfaces] += 1
+        opponent_elos = ratings[opponents] if record_post_match_elo else np.roll(overall_elos, count)
+        row_opponent_elos[rows] = opponent_elos
+
+        # History bookkeeping, as EloEngine._record_opponent
+        sums = AVG_ELO_FACED_DECAY * faced_sums[players] + opponent_elos
+        weights = AVG_ELO_FACED_DECAY * faced_weights_before + 1
+        if exact_avg_elo_faced:
+            pointers = window_rows[rows]
+            dropped_elos = np.where(pointers >= 0, row_opponent_elos[pointers], window_elos[rows])
+            dropping = ~np.isnan(dropped_elos)
+            sums = np.where(dropping, sums - DROPPED_WEIGHT * dropped_elos, sums)
+            weights = np.where(dropping, weights - DROPPED_WEIGHT, weights)
+        faced_sums[players] = sums
+        faced_weights[players] = weights
+        _count_leaderboard_matches(leaderboard_counts, players, opponent_elos, won, 1)
+
+        pointers = evicted_rows[rows]
+        in_batch = pointers >= 0
+        evicting = np.flatnonzero(in_batch | (evicted_surfaces[rows] >= 0))
+        if len(evicting):
+            pointers = pointers[evicting]
+            in_batch = in_batch[evicting]
+            evicting_rows = rows[evicting]
+            evicted_players = players[evicting]
+            surface_match_counts[
+                evicted_players, np.where(in_batch, surfaces[pointers // 2], evicted_surfaces[evicting_rows])
+            ] -= 1
+            _count_leaderboard_matches(
+                leaderboard_counts, evicted_players,
+                np.where(in_batch, row_opponent_elos[pointers], evicted_elos[evicting_rows]),
+                np.where(in_batch, 1 - pointers % 2, evicted_won[evicting_rows]),
+                -1,
+            )
+
+    rounded_columns = [0, 1, 3, 4, 5, 7]
+    pre_match[:, rounded_columns] = round_2(pre_match[:, rounded_columns])
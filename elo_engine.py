@@ -0,0 +1,710 @@
+# Array-backed Elo engine shared by the rating scripts.
+# Player names are mapped to dense integer ids up front so the replay keeps its
+# state in NumPy arrays indexed by id instead of name-keyed dicts.
+import math
+from array import array
+from bisect import bisect_right
+import numpy as np
+import pandas as pd
+from match_history import HISTORY_DTYPE, MatchHistoryStore
+from rating_ranks import RatingRankIndex
+
+try:
+    import numba  # noqa: F401  (only checked for; the kernel lives in elo_kernel.py)
+    HAVE_NUMBA = True
+except ImportError:
+    HAVE_NUMBA = False
+
+# Elo Constants
+INITIAL_RATING = 1500
+DECAY_THRESHOLD_DAYS = 180  # Days before decay starts
+DECAY_RATE = 0.995  # Rating retains 99.5% of value per month (0.5% decay)
+REMOVAL_THRESHOLD_DAYS = 730  # Remove players inactive for 2 years
+SURFACE_TYPES = ["Hard", "Clay", "Grass"]  # Track separate Elo for each surface
+K_BASE = 32  # Base K-factor
+K_MIN = 12  # Minimum K-factor for experienced players
+K_MAX = 50  # Maximum K-factor for new players
+MATCH_HISTORY_LIMIT = 1000  # Limit for tracking career match history
+AVG_ELO_FACED_DECAY = 0.9  # Weight multiplier per older match in "avg Elo faced"
+AVG_ELO_FACED_WINDOW = 50  # Matches kept by the exact "avg Elo faced"
+AVG_ELO_FACED_MODES = ("exact", "fast")  # exact keeps the window, fast is a plain EWMA
+TOP20_ELO = 1800  # Opponent rating counted as "top 20" in the report
+TOP50_ELO = 1600  # Opponent rating counted as "top 50" in the report
+TOP20_RANK = 20  # Opponent ranks counted as "top 20" / "top 50" with rank_opponents
+TOP50_RANK = 50
+# Engine options for the player rating reports (create_elo_ratings.py, run_all_tours.py):
+# unrounded blends, post-match opponent ratings in the history, "vs Top 20/50" by live rank
+REPORT_ENGINE_OPTIONS = {"round_blend": False, "record_post_match_elo": True, "rank_opponents": True}
+RECENT_FORM_DAYS = 180  # Window for "Matches Last 6M"
+
+# Per-player counters kept over the capped match history for the report
+LEADERBOARD_COUNTERS = ["matches_vs_top20", "wins_vs_top20", "matches_vs_top50", "wins_vs_top50"]
+
+SURFACE_CODES = {surface: code for code, surface in enumerate(SURFACE_TYPES)}
+
+# Pre-match values returned for every processed match, named after the
+# matched_atp_records columns they are written to.
+PRE_MATCH_COLUMNS = [
+    "winner_overall_elo",
+    "winner_surface_elo",
+    "winner_total_matches",
+    "winner_avg_elo_faced",
+    "loser_overall_elo",
+    "loser_surface_elo",
+    "loser_total_matches",
+    "loser_avg_elo_faced",
+]
+# Engine state saved by create_running_elos.py after every run (EloEngine.save / load),
+# read by rating_lookup.py and simulate_draw.py
+ELO_CHECKPOINT_FILE = "elo_checkpoint.npz"
+# Checkpoint arrays of the rating event log (rating_event_arrays, in that order)
+EVENT_COLUMNS = ["event_players", "event_days", "event_ratings", "event_surface_ratings"]
+
+# -------------------------
+# ELO FORMULAS
+# -------------------------
+def expected_score(rating_a, rating_b):
+    """Calculate expected probability of Player A beating Player B."""
+    return 1 / (1 + math.pow(10, (rating_b - rating_a) / 400))
+
+def calculate_dynamic_k(matches_played):
+    """Compute dynamic K-factor based on matches played."""
+    return max(K_MIN, min(K_MAX, K_BASE * (1 / (1 + 0.1 * matches_played))))
+
+def calculate_decay_factor(days_inactive):
+    """Return the multiplier applied to a rating after days_inactive days without a match."""
+    if days_inactive > DECAY_THRESHOLD_DAYS:
+        months_inactive = days_inactive / 30
+        return DECAY_RATE ** months_inactive
+    return 1.0
+
+def calculate_decay_factors(days_inactive):
+    """Vectorized calculate_decay_factor over an array of inactive days."""
+    days_inactive = np.asarray(days_inactive)
+    return np.where(days_inactive > DECAY_THRESHOLD_DAYS, DECAY_RATE ** (days_inactive / 30), 1.0)
+
+def update_weighted_elo_faced(weighted_sum, total_weight, opponent_elo, dropped_elo=None):
+    """Fold a new opponent rating into the running "avg Elo faced" sums.
+
+    In exact mode dropped_elo is the rating that just left the last
+    AVG_ELO_FACED_WINDOW matches; leaving it as None gives a plain EWMA.
+    """
+    weighted_sum = AVG_ELO_FACED_DECAY * weighted_sum + opponent_elo
+    total_weight = AVG_ELO_FACED_DECAY * total_weight + 1
+    if dropped_elo is not None:
+        dropped_weight = AVG_ELO_FACED_DECAY ** AVG_ELO_FACED_WINDOW
+        weighted_sum -= dropped_weight * dropped_elo
+        total_weight -= dropped_weight
+    return weighted_sum, total_weight
+
+def calculate_weighted_avg_elo_faced(weighted_sum, total_weight):
+    """Compute exponentially weighted average Elo faced from the running sums."""
+    return weighted_sum / total_weight if total_weight > 0 else 0
+
+def calculate_log_surface_weighting(overall_elo, surface_elo, total_matches, surface_matches):
+    """Blend overall Elo and surface Elo using logarithmic weighting."""
+    if total_matches == 0:  # Prevent division by zero
+        return overall_elo
+    surface_weight = math.log(1 + surface_matches) / math.log(1 + total_matches)
+    return surface_weight * surface_elo + (1 - surface_weight) * overall_elo
+
+# -------------------------
+# ENCODING HELPERS
+# -------------------------
+def to_days(dates):
+    """Convert a sequence of dates to integer days since 1970-01-01."""
+    return pd.to_datetime(pd.Series(dates)).to_numpy().astype("datetime64[D]").astype(np.int64)
+
+def from_day(day):
+    """Convert an integer day back to a YYYY-MM-DD string."""
+    return str(np.datetime64(int(day), "D"))
+
+def encode_surfaces(surfaces):
+    """Map surface names to integer codes (-1 for surfaces we don't rate)."""
+    return pd.Series(surfaces).map(SURFACE_CODES).fillna(-1).to_numpy().astype(np.int64)
+
+# -------------------------
+# PLAYER IDS
+# -------------------------
+class PlayerIndex:
+    """Name -> dense id registry shared by the rating models (EloEngine, GlickoModel, ServeReturnModel).
+
+    Ids are assigned in order of first appearance. Subclasses grow their
+    per-player state in _add_players(names), called with each run of new names.
+    """
+
+    def __init__(self):
+        self.player_index = {}
+        self.player_names = []
+
+    @property
+    def num_players(self):
+        return len(self.player_names)
+
+    def encode_players(self, names):
+        """Map player names to ids, registering players not seen before."""
+        codes, uniques = pd.factorize(pd.Series(names), use_na_sentinel=False)
+        ids = np.empty(len(uniques), dtype=np.int64)
+        new_names = []
+        for i, name in enumerate(uniques):
+            player_id = self.player_index.get(name)
+            if player_id is None:
+                player_id = self.num_players + len(new_names)
+                self.player_index[name] = player_id
+                new_names.append(name)
+            ids[i] = player_id
+        if new_names:
+            self.player_names.extend(new_names)
+            self._add_players(new_names)
+        return ids[codes]
+
+    def encode_match_players(self, winner_names, loser_names):
+        """Return (winner_ids, loser_ids), numbering players in order of first appearance."""
+        pairs = np.column_stack([np.asarray(winner_names, dtype=object), np.asarray(loser_names, dtype=object)])
+        ids = self.encode_players(pairs.ravel()).reshape(-1, 2)
+        return ids[:, 0], ids[:, 1]
+
+    def _add_players(self, names):
+        raise NotImplementedError
+
+# -------------------------
+# ENGINE
+# -------------------------
+class EloEngine(PlayerIndex):
+    """Sequential surface-blended Elo replay over integer-encoded players.
+
+    round_blend rounds the blended ratings to 2 decimals before computing the
+    expected score (create_running_elos.py behaviour). record_post_match_elo
+    stores the opponent's post-match rating in the match history instead of the
+    pre-match one (create_elo_ratings.py behaviour). metrics, if given, is
+    updated with every processed chunk (see elo_metrics.PredictionMetrics).
+    record_events keeps every post-match rating for point-in-time lookups
+    (see rating_lookup.RatingLookup). The replay loop runs through the compiled
+    kernel in elo_kernel.py (Numba is part of the README install and the kernel
+    is what meets the 10x target of bench_elo_engine.py); use_numba=False runs
+    the pure-Python loop instead, with identical results. batched replays through
+    the NumPy level scheduler in elo_batches.py instead (also identical).
+    rank_opponents counts the "vs Top 20" / "vs Top 50" matches by the
+    opponent's rank at match time among players active in the last
+    DECAY_THRESHOLD_DAYS days (see rating_ranks.RatingRankIndex) instead of the
+    TOP20_ELO / TOP50_ELO thresholds; ranks depend on every player's rating, so
+    this needs a sequential replay (the Python loop or the Numba kernel).
+    """
+
+    def __init__(self, round_blend=True, record_post_match_elo=False, avg_elo_faced_mode="exact", metrics=None,
+                 record_events=False, use_numba=None, batched=False, rank_opponents=False):
+        if avg_elo_faced_mode not in AVG_ELO_FACED_MODES:
+            raise ValueError(f"avg_elo_faced_mode must be one of {AVG_ELO_FACED_MODES}")
+        if use_numba and not HAVE_NUMBA:
+            raise ValueError("use_numba=True but Numba is not installed.")
+        if rank_opponents and batched:
+            raise ValueError("rank_opponents needs a sequential replay (batched=False).")
+        self.use_numba = HAVE_NUMBA if use_numba is None else use_numba
+        self.batched = batched
+        self.rank_opponents = rank_opponents
+        # Live overall ratings of recently active players, for opponent ranks
+        self.rank_index = RatingRankIndex(DECAY_THRESHOLD_DAYS) if rank_opponents else None
+        self.round_blend = round_blend
+        self.record_post_match_elo = record_post_match_elo
+        self.avg_elo_faced_mode = avg_elo_faced_mode
+        self.metrics = metrics
+        self.record_events = record_events
+        self.rating_events = []  # Chunks of (player, day, overall, surface ratings) after each match
+        super().__init__()
+        # Ratings are stored as of last_match; inactivity decay is applied when they are read
+        self.ratings = np.empty(0)
+        self.surface_ratings = np.empty((0, len(SURFACE_TYPES)))  # NaN until played on
+        self.last_match = np.empty(0, dtype=np.int64)  # -1 until the first match
+        self.match_counts = np.empty(0, dtype=np.int64)
+        self.surface_match_counts = np.empty((0, len(SURFACE_TYPES)), dtype=np.int64)
+        self.leaderboard_counts = np.empty((0, len(LEADERBOARD_COUNTERS)), dtype=np.int64)
+        self.faced_sums = np.empty(0)  # Running "avg Elo faced" numerator
+        self.faced_weights = np.empty(0)  # ... and denominator
+        self.match_history = MatchHistoryStore(MATCH_HISTORY_LIMIT)
+        self.match_days = []  # Sorted day of every match per player, array('i')
+
+    def _add_players(self, names):
+        count = len(names)
+        self.ratings = np.concatenate([self.ratings, np.full(count, float(INITIAL_RATING))])
+        self.surface_ratings = np.concatenate(
+            [self.surface_ratings, np.full((count, len(SURFACE_TYPES)), np.nan)]
+        )
+        self.last_match = np.concatenate([self.last_match, np.full(count, -1, dtype=np.int64)])
+        self.match_counts = np.concatenate([self.match_counts, np.zeros(count, dtype=np.int64)])
+        self.surface_match_counts = np.concatenate(
+            [self.surface_match_counts, np.zeros((count, len(SURFACE_TYPES)), dtype=np.int64)]
+        )
+        self.leaderboard_counts = np.concatenate(
+            [self.leaderboard_counts, np.zeros((count, len(LEADERBOARD_COUNTERS)), dtype=np.int64)]
+        )
+        self.faced_sums = np.concatenate([self.faced_sums, np.zeros(count)])
+        self.faced_weights = np.concatenate([self.faced_weights, np.zeros(count)])
+        self.match_history.add_players(count)
+        self.match_days.extend(array("i") for _ in range(count))
+
+    def avg_elo_faced(self, player):
+        """Exponentially weighted average Elo of the player's opponents so far."""
+        return calculate_weighted_avg_elo_faced(float(self.faced_sums[player]), float(self.faced_weights[player]))
+
+    def _record_opponent(self, player, opponent, opponent_elo, surface, won, opponent_rank=0):
+        """Append a match to the player's history and fold it into the running counts and sums."""
+        dropped_elo = None
+        if self.avg_elo_faced_mode == "exact":
+            dropped_elo = self.match_history.opponent_elo_back(player, AVG_ELO_FACED_WINDOW)
+        self.faced_sums[player], self.faced_weights[player] = update_weighted_elo_faced(
+            float(self.faced_sums[player]), float(self.faced_weights[player]), opponent_elo, dropped_elo
+        )
+        self._count_leaderboard_match(player, opponent_elo, opponent_rank, won, 1)
+        # Counts cover the same window as the capped history
+        evicted = self.match_history.append(player, opponent, opponent_elo, surface, won, opponent_rank)
+        if evicted is not None:
+            self.surface_match_counts[player, evicted["surface"]] -= 1
+            self._count_leaderboard_match(
+                player, float(evicted["opponent_elo"]), int(evicted["opponent_rank"]), int(evicted["won"]), -1
+            )
+
+    def _count_leaderboard_match(self, player, opponent_elo, opponent_rank, won, change):
+        """Add (change=1) or remove (change=-1) a match from the top-20/top-50 counters."""
+        if self.rank_opponents:
+            top50 = 0 < opponent_rank <= TOP50_RANK
+            top20 = 0 < opponent_rank <= TOP20_RANK
+        else:
+            top50 = opponent_elo >= TOP50_ELO
+            top20 = opponent_elo >= TOP20_ELO
+        if top50:
+            counts = self.leaderboard_counts[player]
+            counts[2] += change
+            counts[3] += change * won
+            if top20:
+                counts[0] += change
+                counts[1] += change * won
+
+    def apply_rating_decay(self, player, day):
+        """Apply Elo decay for inactivity up to the given day to the stored ratings.
+
+        Only used when the player plays again and last_match moves to day;
+        everything else reads decayed values through decayed_ratings.
+        """
+        decay_factor = calculate_decay_factor(day - int(self.last_match[player]))
+        if decay_factor != 1.0:
+            self.ratings[player] *= decay_factor
+            self.surface_ratings[player] *= decay_factor  # NaN surfaces stay unset
+
+    def _prepare_player(self, player, surface, day):
+        """Create the player's surface rating if needed and apply inactivity decay."""
+        if self.last_match[player] < 0:
+            self.last_match[player] = day
+        if math.isnan(self.surface_ratings[player, surface]):
+            self.surface_ratings[player, surface] = INITIAL_RATING
+        self.apply_rating_decay(player, day)
+
+    def process(self, winners, losers, days, surfaces, retired):
+        """Replay encoded matches in order and return each match's pre-match values.
+
+        All arguments are equal-length arrays: player ids from encode_players,
+        days from to_days, surface codes and a retirement flag. Walkovers and
+        unrated surfaces must already be filtered out.
+        """
+        if self.batched and len(winners):
+            return self._process_batched(winners, losers, days, surfaces, retired)
+        if self.use_numba and len(winners):
+            return self._process_numba(winners, losers, days, surfaces, retired)
+        num_matches = len(winners)
+        pre_match = {column: np.empty(num_matches) for column in PRE_MATCH_COLUMNS}
+        pre_match["expected_winner"] = np.empty(num_matches)
+        ratings = self.ratings
+        surface_ratings = self.surface_ratings
+        surface_match_counts = self.surface_match_counts
+        history = self.match_history
+        rank_index = self.rank_index
+        winner_rank = loser_rank = 0
+        if self.record_events:
+            event_players = np.column_stack([winners, losers]).ravel()
+            event_days = np.repeat(np.asarray(days), 2)
+            event_ratings = np.empty(2 * num_matches)
+            event_surface_ratings = np.empty((2 * num_matches, len(SURFACE_TYPES)))
+        rows = zip(
+            np.asarray(winners).tolist(),
+            np.asarray(losers).tolist(),
+            np.asarray(days).tolist(),
+            np.asarray(surfaces).tolist(),
+            np.asarray(retired).tolist(),
+        )
+        for i, (winner, loser, day, surface, is_retired) in enumerate(rows):
+            self._prepare_player(winner, surface, day)
+            self._prepare_player(loser, surface, day)
+
+            winner_overall_elo = float(ratings[winner])
+            loser_overall_elo = float(ratings[loser])
+            if rank_index is not None:
+                rank_index.expire(day)
+                rank_index.update(winner, winner_overall_elo, day)
+                rank_index.update(loser, loser_overall_elo, day)
+                winner_rank = rank_index.rank(winner_overall_elo)
+                loser_rank = rank_index.rank(loser_overall_elo)
+            winner_surface_elo = float(surface_ratings[winner, surface])
+            loser_surface_elo = float(surface_ratings[loser, surface])
+
+            total_matches_winner = history.length(winner)
+            total_matches_loser = history.length(loser)
+            surface_matches_winner = int(surface_match_counts[winner, surface])
+            surface_matches_loser = int(surface_match_counts[loser, surface])
+
+            winner_blended_elo = calculate_log_surface_weighting(
+                winner_overall_elo, winner_surface_elo, total_matches_winner, surface_matches_winner
+            )
+            loser_blended_elo = calculate_log_surface_weighting(
+                loser_overall_elo, loser_surface_elo, total_matches_loser, surface_matches_loser
+            )
+            if self.round_blend:
+                winner_blended_elo = round(winner_blended_elo, 2)
+                loser_blended_elo = round(loser_blended_elo, 2)
+
+            K_factor_winner = calculate_dynamic_k(total_matches_winner)
+            K_factor_loser = calculate_dynamic_k(total_matches_loser)
+            if is_retired:  # Halve K-factor for retirements
+                K_factor_winner *= 0.5
+                K_factor_loser *= 0.5
+
+            expected_winner = expected_score(winner_blended_elo, loser_blended_elo)
+            expected_loser = 1 - expected_winner
+
+            pre_match["winner_overall_elo"][i] = round(winner_overall_elo, 2)
+            pre_match["winner_surface_elo"][i] = round(winner_surface_elo, 2)
+            pre_match["winner_total_matches"][i] = total_matches_winner
+            pre_match["winner_avg_elo_faced"][i] = round(self.avg_elo_faced(winner), 2)
+            pre_match["loser_overall_elo"][i] = round(loser_overall_elo, 2)
+            pre_match["loser_surface_elo"][i] = round(loser_surface_elo, 2)
+            pre_match["loser_total_matches"][i] = total_matches_loser
+            pre_match["loser_avg_elo_faced"][i] = round(self.avg_elo_faced(loser), 2)
+            pre_match["expected_winner"][i] = expected_winner
+
+            # Update ratings post-match
+            ratings[winner] = winner_overall_elo + K_factor_winner * (1 - expected_winner)
+            ratings[loser] = loser_overall_elo + K_factor_loser * (0 - expected_loser)
+            surface_ratings[winner, surface] = winner_surface_elo + K_factor_winner * (1 - expected_winner)
+            surface_ratings[loser, surface] = loser_surface_elo + K_factor_loser * (0 - expected_loser)
+            if rank_index is not None:
+                rank_index.update(winner, float(ratings[winner]), day)
+                rank_index.update(loser, float(ratings[loser]), day)
+
+            if self.record_events:
+                event_ratings[2 * i] = ratings[winner]
+                event_ratings[2 * i + 1] = ratings[loser]
+                event_surface_ratings[2 * i] = surface_ratings[winner]
+                event_surface_ratings[2 * i + 1] = surface_ratings[loser]
+
+            # Update match history and last match date
+            self.last_match[winner] = day
+            self.last_match[loser] = day
+            self.match_days[winner].append(day)
+            self.match_days[loser].append(day)
+            self.match_counts[winner] += 1
+            self.match_counts[loser] += 1
+            surface_match_counts[winner, surface] += 1
+            surface_match_counts[loser, surface] += 1
+            if self.record_post_match_elo:
+                winner_opponent_elo = float(ratings[loser])
+                loser_opponent_elo = float(ratings[winner])
+            else:
+                winner_opponent_elo = loser_overall_elo
+                loser_opponent_elo = winner_overall_elo
+            self._record_opponent(winner, loser, winner_opponent_elo, surface, 1, loser_rank)
+            self._record_opponent(loser, winner, loser_opponent_elo, surface, 0, winner_rank)
+
+        if not self.record_events:
+            event_players = event_days = event_ratings = event_surface_ratings = None
+        return self._finish_batch(
+            pre_match, surfaces, days, retired, (event_players, event_days, event_ratings, event_surface_ratings)
+        )
+
+    def _finish_batch(self, pre_match, surfaces, days, retired, events):
+        for column in ("winner_total_matches", "loser_total_matches"):
+            pre_match[column] = pre_match[column].astype(np.int64)
+        if self.metrics is not None:
+            self.metrics.update(pre_match["expected_winner"], surfaces, days, retired)
+        if self.record_events and len(pre_match["expected_winner"]):
+            self.rating_events.append(events)
+        return pre_match
+
+    def _process_numba(self, winners, losers, days, surfaces, retired):
+        """process() through elo_kernel.replay_kernel."""
+        from elo_kernel import replay_kernel  # elo_kernel imports this module's constants
+
+        return self._process_arrays(replay_kernel, winners, losers, days, surfaces, retired)
+
+    def _process_batched(self, winners, losers, days, surfaces, retired):
+        """process() through elo_batches.replay_batches."""
+        from elo_batches import replay_batches  # elo_batches imports this module's constants
+
+        return self._process_arrays(replay_batches, winners, losers, days, surfaces, retired)
+
+    def _process_arrays(self, replay, winners, losers, days, surfaces, retired):
+        """Run a whole-batch replay function; history entries are written back once per player.
+
+        replay takes the arguments of elo_kernel.replay_kernel and updates the
+        state arrays in place.
+        """
+        winners = np.asarray(winners, dtype=np.int64)
+        losers = np.asarray(losers, dtype=np.int64)
+        days = np.asarray(days, dtype=np.int64)
+        surfaces = np.asarray(surfaces, dtype=np.int64)
+        retired = np.asarray(retired, dtype=bool)
+        num_rows = 2 * len(winners)
+
+        # Rows 2i / 2i + 1 are match i for its winner / loser; group them by player in replay order
+        row_players = np.column_stack([winners, losers]).ravel()
+        order = np.argsort(row_players, kind="stable")
+        sorted_players = row_players[order]
+        group_starts = np.flatnonzero(np.r_[True, sorted_players[1:] != sorted_players[:-1]])
+        group_ends = np.r_[group_starts[1:], num_rows]
+        positions = np.arange(num_rows) - np.repeat(group_starts, group_ends - group_starts)
+
+        # Pointers to the history entry AVG_ELO_FACED_WINDOW / MATCH_HISTORY_LIMIT matches back
+        window_rows = np.full(num_rows, -1, dtype=np.int64)
+        evicted_rows = np.full(num_rows, -1, dtype=np.int64)
+        for back, pointer_rows in ((AVG_ELO_FACED_WINDOW, window_rows), (MATCH_HISTORY_LIMIT, evicted_rows)):
+            in_batch = np.flatnonzero(positions >= back)
+            pointer_rows[order[in_batch]] = order[in_batch - back]
+        window_elos = np.full(num_rows, np.nan)
+        evicted_elos = np.full(num_rows, np.nan)
+        evicted_surfaces = np.full(num_rows, -1, dtype=np.int64)
+        evicted_won = np.zeros(num_rows, dtype=np.int64)
+        evicted_ranks = np.zeros(num_rows, dtype=np.int64)
+        prior_counts = self.match_counts[sorted_players[group_starts]].tolist()
+        for player, start, end, prior in zip(
+            sorted_players[group_starts].tolist(), group_starts.tolist(), group_ends.tolist(), prior_counts
+        ):
+            if prior == 0:
+                continue
+            # Rows whose pointer falls before this batch read the stored history
+            for back in (AVG_ELO_FACED_WINDOW, MATCH_HISTORY_LIMIT):
+                batch_positions = np.arange(max(0, back - prior), min(back, end - start))
+                if not len(batch_positions):
+                    continue
+                recent = self.match_history.recent(player, back)
+                entries = recent[len(recent) - back + batch_positions]
+                rows = order[start + batch_positions]
+                if back == AVG_ELO_FACED_WINDOW:
+                    window_elos[rows] = entries["opponent_elo"]
+                else:
+                    evicted_elos[rows] = entries["opponent_elo"]
+                    evicted_surfaces[rows] = entries["surface"]
+                    evicted_won[rows] = entries["won"]
+                    evicted_ranks[rows] = entries["opponent_rank"]
+
+        pre_match_array = np.empty((len(winners), len(PRE_MATCH_COLUMNS) + 1))
+        row_opponent_elos = np.empty(num_rows)
+        event_ratings = np.empty(num_rows)
+        event_surface_ratings = np.empty((num_rows, len(SURFACE_TYPES)))
+        row_opponent_ranks = np.zeros(num_rows, dtype=np.int64)
+        if self.rank_opponents:
+            # Each match adds at most one expiry entry per player
+            rank_arrays = self.rank_index.to_arrays(self.num_players, num_rows)
+        else:
+            rank_arrays = (
+                np.empty(0), np.zeros(3, dtype=np.int64), np.empty(0), np.empty(0, dtype=np.int64),
+                np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64),
+            )
+        replay(
+            winners, losers, days, surfaces, retired,
+            window_rows, window_elos, evicted_rows, evicted_elos, evicted_surfaces, evicted_won,
+            self.ratings, self.surface_ratings, self.last_match, self.match_counts, self.surface_match_counts,
+            self.leaderboard_counts, self.faced_sums, self.faced_weights,
+            self.round_blend, self.record_post_match_elo, self.avg_elo_faced_mode == "exact",
+            pre_match_array, row_opponent_elos, event_ratings, event_surface_ratings,
+            self.rank_opponents, DECAY_THRESHOLD_DAYS, *rank_arrays, evicted_ranks, row_opponent_ranks,
+        )
+        if self.rank_opponents:
+            self.rank_index = RatingRankIndex.from_arrays(DECAY_THRESHOLD_DAYS, *rank_arrays)
+
+        # Write the batch into the per-player history and match-day logs
+        entries = np.empty(num_rows, dtype=HISTORY_DTYPE)
+        entries["opponent"] = row_players[order ^ 1]
+        entries["opponent_elo"] = row_opponent_elos[order]
+        entries["surface"] = surfaces[order // 2]
+        entries["won"] = 1 - order % 2
+        entries["opponent_rank"] = row_opponent_ranks[order]
+        sorted_days = days[order // 2].astype(np.int32)
+        for player, start, end in zip(sorted_players[group_starts].tolist(), group_starts.tolist(), group_ends.tolist()):
+            self.match_history.extend(player, entries[start:end])
+            self.match_days[player].frombytes(sorted_days[start:end].tobytes())
+
+        pre_match = {column: pre_match_array[:, index] for index, column in enumerate(PRE_MATCH_COLUMNS)}
+        pre_match["expected_winner"] = pre_match_array[:, -1]
+        events = (row_players, np.repeat(days, 2), event_ratings, event_surface_ratings)
+        return self._finish_batch(pre_match, surfaces, days, retired, events)
+
+    def rating_event_arrays(self):
+        """All recorded rating events as (players, days, ratings, surface_ratings) arrays in replay order."""
+        if not self.rating_events:
+            return (
+                np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64),
+                np.empty(0), np.empty((0, len(SURFACE_TYPES))),
+            )
+        return tuple(np.concatenate(column) for column in zip(*self.rating_events))
+
+    # -------------------------
+    # REPORT
+    # -------------------------
+    def matches_in_window(self, player, day, window_days):
+        """Number of the player's matches in the window_days days up to and including day."""
+        days = self.match_days[player]
+        return bisect_right(days, day) - bisect_right(days, day - window_days)
+
+    def decay_factors(self, player_ids, day):
+        """Vectorized calculate_decay_factor from each player's last match to day."""
+        return calculate_decay_factors(day - self.last_match[player_ids])
+
+    def decayed_ratings(self, player_ids, day):
+        """Overall and (players, surfaces) ratings as of day, without changing the stored ratings."""
+        decay_factor = self.decay_factors(player_ids, day)
+        return self.ratings[player_ids] * decay_factor, self.surface_ratings[player_ids] * decay_factor[:, None]
+
+    def blended_ratings(self, player_names, surface, day):
+        """Surface-blended Elo of each named player as of day, as match predictions use it.
+
+        Inactivity decay up to day is applied without changing the engine state.
+        Players the engine has never seen get INITIAL_RATING.
+        """
+        player_ids = np.array([self.player_index.get(name, -1) for name in player_names], dtype=np.int64)
+        known = player_ids >= 0
+        ids = player_ids[known]
+        decay_factor = self.decay_factors(ids, day)
+        overall_elo = self.ratings[ids] * decay_factor
+        surface_elo = self.surface_ratings[ids, SURFACE_CODES[surface]]
+        surface_elo = np.where(np.isnan(surface_elo), INITIAL_RATING, surface_elo) * decay_factor
+        total_matches = np.minimum(self.match_counts[ids], MATCH_HISTORY_LIMIT)
+        surface_matches = self.surface_match_counts[ids, SURFACE_CODES[surface]]
+        surface_weight = np.log1p(surface_matches) / np.log1p(np.maximum(total_matches, 1))
+
+        blended = np.full(len(player_ids), float(INITIAL_RATING))
+        blended[known] = surface_weight * surface_elo + (1 - surface_weight) * overall_elo
+        return blended
+
+    def rating_report(self, day):
+        """Return the player_elo_ratings_updated.csv table with ratings decayed to the given day."""
+        all_players = np.arange(self.num_players)
+        overall_elos, surface_elos = self.decayed_ratings(all_players, day)
+        overall_elos = overall_elos.tolist()
+        surface_elos = surface_elos.tolist()
+
+        final_ratings = {}
+        for player, name in enumerate(self.player_names):
+            rating = overall_elos[player]
+            last_played = int(self.last_match[player])
+            days_inactive = day - last_played
+            if days_inactive > REMOVAL_THRESHOLD_DAYS:
+                continue
+            matches_last_6m = self.matches_in_window(player, day, RECENT_FORM_DAYS)
+            career_matches = self.match_history.length(player)
+            avg_elo_faced = self.avg_elo_faced(player)
+            matches_vs_top20, wins_vs_top20, matches_vs_top50, wins_vs_top50 = self.leaderboard_counts[player].tolist()
+            winrate_vs_top20 = wins_vs_top20 / matches_vs_top20 if matches_vs_top20 else 0
+            winrate_vs_top50 = wins_vs_top50 / matches_vs_top50 if matches_vs_top50 else 0
+            surface_ratings = dict(zip(SURFACE_TYPES, surface_elos[player]))
+            final_ratings[name] = {
+                "Overall Elo": round(rating, 2),
+                "Hard Elo": round(rating if np.isnan(surface_ratings["Hard"]) else surface_ratings["Hard"], 2),
+                "Clay Elo": round(rating if np.isnan(surface_ratings["Clay"]) else surface_ratings["Clay"], 2),
+                "Grass Elo": round(rating if np.isnan(surface_ratings["Grass"]) else surface_ratings["Grass"], 2),
+                "Last Match": from_day(last_played),
+                "Matches Last 6M": matches_last_6m,
+                "Career Matches": career_matches,
+                "Avg Elo Faced": round(avg_elo_faced, 2),
+                "Matches vs Top 20": matches_vs_top20,
+                "Winrate vs Top 20": round(winrate_vs_top20, 2),
+                "Matches vs Top 50": matches_vs_top50,
+                "Winrate vs Top 50": round(winrate_vs_top50, 2),
+            }
+
+        ratings_df = pd.DataFrame.from_dict(final_ratings, orient="index").reset_index()
+        ratings_df.rename(columns={"index": "Player"}, inplace=True)
+        return ratings_df
+
+    # -------------------------
+    # CHECKPOINTS
+    # -------------------------
+    def save(self, path, high_water_mark, events=True, extra=None):
+        """Save the full engine state with the (day, matchid) of the last row processed.
+
+        events=False leaves out the rating event log, which grows with every
+        match; load() then takes it from a later checkpoint of the same replay.
+        extra maps names to arrays saved in the same file, for state that is
+        resumed together with the engine (load() ignores them).
+        """
+        history_lengths, history = self.match_history.to_arrays()
+        event_arrays = self.rating_event_arrays() if events else [np.empty(0)] * len(EVENT_COLUMNS)
+        np.savez(
+            path,
+            **(extra or {}),
+            record_events=self.record_events,
+            events_saved=events,
+            **dict(zip(EVENT_COLUMNS, event_arrays)),
+            round_blend=self.round_blend,
+            record_post_match_elo=self.record_post_match_elo,
+            avg_elo_faced_mode=self.avg_elo_faced_mode,
+            rank_opponents=self.rank_opponents,
+            high_water_mark=np.array(high_water_mark, dtype=np.int64),
+            player_names=np.array(self.player_names, dtype=str),
+            ratings=self.ratings,
+            surface_ratings=self.surface_ratings,
+            last_match=self.last_match,
+            match_counts=self.match_counts,
+            surface_match_counts=self.surface_match_counts,
+            leaderboard_counts=self.leaderboard_counts,
+            faced_sums=self.faced_sums,
+            faced_weights=self.faced_weights,
+            history_lengths=history_lengths,
+            history=history,
+            match_day_lengths=np.array([len(days) for days in self.match_days], dtype=np.int64),
+            match_days=np.array([day for days in self.match_days for day in days], dtype=np.int32),
+        )
+
+    @classmethod
+    def load(cls, path, events_path=None):
+        """Load an engine saved with save(); returns (engine, high_water_mark).
+
+        A checkpoint saved with events=False reads its rating events from
+        events_path, a later checkpoint of the same replay, up to its own
+        high-water mark.
+        """
+        with np.load(path) as checkpoint:
+            elo = cls(
+                round_blend=bool(checkpoint["round_blend"]),
+                record_post_match_elo=bool(checkpoint["record_post_match_elo"]),
+                avg_elo_faced_mode=str(checkpoint["avg_elo_faced_mode"]),
+                record_events=bool(checkpoint["record_events"]),
+                rank_opponents=bool(checkpoint["rank_opponents"]),
+            )
+            high_water_mark = tuple(checkpoint["high_water_mark"].tolist())
+            if bool(checkpoint["events_saved"]):
+                events = tuple(checkpoint[column] for column in EVENT_COLUMNS)
+            elif elo.record_events:
+                if events_path is None:
+                    raise ValueError(f"{path} was saved without its rating events; pass events_path.")
+                with np.load(events_path) as source:
+                    # Events are in replay order and the high-water day is the last one processed
+                    count = np.searchsorted(source["event_days"], high_water_mark[0], side="right")
+                    events = tuple(source[column][:count] for column in EVENT_COLUMNS)
+            if elo.record_events and len(events[0]):
+                elo.rating_events = [events]
+            elo.player_names = checkpoint["player_names"].tolist()
+            elo.player_index = {name: player_id for player_id, name in enumerate(elo.player_names)}
+            elo.ratings = checkpoint["ratings"]
+            elo.surface_ratings = checkpoint["surface_ratings"]
+            elo.last_match = checkpoint["last_match"]
+            elo.match_counts = checkpoint["match_counts"]
+            elo.surface_match_counts = checkpoint["surface_match_counts"]
+            elo.leaderboard_counts = checkpoint["leaderboard_counts"]
+            elo.faced_sums = checkpoint["faced_sums"]
+            elo.faced_weights = checkpoint["faced_weights"]
+            elo.match_history = MatchHistoryStore.from_arrays(
+                MATCH_HISTORY_LIMIT, checkpoint["history_lengths"], checkpoint["history"]
+            )
+            match_days = checkpoint["match_days"]
+            offsets = np.cumsum(checkpoint["match_day_lengths"])
+            elo.match_days = [array("i", days.tolist()) for days in np.split(match_days, offsets)[:-1]]
+            if elo.rank_opponents:
+                elo.rank_index = RatingRankIndex.from_ratings(DECAY_THRESHOLD_DAYS, elo.ratings, elo.last_match)
+        return elo, high_water_mark
@@ -0,0 +1,181 @@
+# Gradient-based fitting of the Elo constants.
+# log_loss_gradient replays the sweep's update equations (elo_sweep.py: dynamic
+# K-factor as in calculate_dynamic_k, inactivity decay, log surface blend) for
+# one configuration and carries, next to every rating, its derivatives with
+# respect to the fitted constants (forward-mode sensitivities). One replay
+# therefore gives the log loss and its exact gradient, and fit() runs a bounded
+# Adam optimizer on it, converging in tens of replays where a grid search needs
+# thousands of configurations.
+#
+# DECAY_THRESHOLD_DAYS is not fitted: the log loss is a step function of it.
+#
+# Usage: python3 elo_fit.py [--iterations 40]
+import argparse
+import math
+import time
+import numpy as np
+import pandas as pd
+from elo_engine import DECAY_THRESHOLD_DAYS, INITIAL_RATING, MATCH_HISTORY_LIMIT, SURFACE_TYPES
+from elo_sweep import default_config, load_stream
+
+# SURFACE_WEIGHT_SCALE multiplies the log surface weight: 1 is the current
+# blend, 0 ignores surface ratings.
+FIT_PARAMETERS = ["K_BASE", "K_MIN", "K_MAX", "DECAY_RATE", "SURFACE_WEIGHT_SCALE"]
+PARAMETER_BOUNDS = {
+    "K_BASE": (1.0, 200.0),
+    "K_MIN": (1.0, 100.0),
+    "K_MAX": (1.0, 200.0),
+    "DECAY_RATE": (0.9, 1.0),
+    "SURFACE_WEIGHT_SCALE": (0.0, 1.0),
+}
+# Optimizer step units: roughly how far each parameter moves for a similar change in log loss
+PARAMETER_SCALES = {"K_BASE": 5.0, "K_MIN": 2.0, "K_MAX": 5.0, "DECAY_RATE": 0.005, "SURFACE_WEIGHT_SCALE": 0.1}
+RESULTS_FILE = "elo_fit_results.csv"
+LOG10_OVER_400 = math.log(10) / 400
+
+def default_parameters():
+    """The fitted constants as create_elo_ratings.py currently uses them."""
+    config = default_config()
+    return np.array([config[name] for name in FIT_PARAMETERS[:-1]] + [1.0], dtype=float)
+
+def k_factor_table(parameters):
+    """K-factor for every capped match count and its gradient, shapes (counts,) and (counts, parameters).
+
+    K = max(K_MIN, min(K_MAX, K_BASE / (1 + 0.1 * matches))), as calculate_dynamic_k.
+    """
+    k_base, k_min, k_max = parameters[:3]
+    scale = 1 / (1 + 0.1 * np.arange(MATCH_HISTORY_LIMIT + 1))
+    unclipped = k_base * scale
+    table = np.maximum(k_min, np.minimum(k_max, unclipped))
+    gradient = np.zeros((len(table), len(FIT_PARAMETERS)))
+    at_min = k_min > np.minimum(k_max, unclipped)
+    at_max = ~at_min & (k_max < unclipped)
+    free = ~at_min & ~at_max
+    gradient[free, 0] = scale[free]
+    gradient[at_min, 1] = 1.0
+    gradient[at_max, 2] = 1.0
+    return table, gradient
+
+def log_loss_gradient(stream, parameters, decay_threshold=DECAY_THRESHOLD_DAYS):
+    """Mean log loss of the replay with parameters (FIT_PARAMETERS order) and its gradient."""
+    num_parameters = len(FIT_PARAMETERS)
+    decay_rate, surface_scale = parameters[3], parameters[4]
+    k_table, k_gradient = k_factor_table(parameters)
+    k_table = k_table.tolist()
+
+    num_players = len(stream["player_names"])
+    ratings = [float(INITIAL_RATING)] * num_players
+    surface_ratings = [[float(INITIAL_RATING)] * len(SURFACE_TYPES) for _ in range(num_players)]
+    # d rating / d parameter for every rating above
+    rating_gradients = np.zeros((num_players, num_parameters))
+    surface_gradients = np.zeros((num_players, len(SURFACE_TYPES), num_parameters))
+    log_loss = 0.0
+    log_loss_gradient = np.zeros(num_parameters)
+
+    def log_weight(total_matches, surface_matches):
+        return math.log(1 + surface_matches) / math.log(1 + total_matches) if total_matches else 0.0
+
+    def prepare(player, surface, first_on_surface, days_inactive):
+        if first_on_surface:
+            surface_ratings[player][surface] = float(INITIAL_RATING)
+            surface_gradients[player, surface] = 0.0
+        if days_inactive > decay_threshold:
+            months = days_inactive / 30
+            decay_factor = decay_rate ** months
+            decay_derivative = months * decay_rate ** (months - 1)
+            # d(rating * f) = f * d rating + rating * df, with f depending on DECAY_RATE only
+            rating_gradients[player] *= decay_factor
+            rating_gradients[player, 3] += ratings[player] * decay_derivative
+            surface_gradients[player] *= decay_factor
+            surface_gradients[player, :, 3] += np.array(surface_ratings[player]) * decay_derivative
+            ratings[player] *= decay_factor
+            surface_ratings[player] = [rating * decay_factor for rating in surface_ratings[player]]
+
+    def blend(player, surface, weight):
+        rating = ratings[player]
+        surface_rating = surface_ratings[player][surface]
+        blended = surface_scale * weight * surface_rating + (1 - surface_scale * weight) * rating
+        gradient = (
+            surface_scale * weight * surface_gradients[player, surface]
+            + (1 - surface_scale * weight) * rating_gradients[player]
+        )
+        gradient[4] += weight * (surface_rating - rating)
+        return blended, gradient
+
+    rows = zip(
+        stream["winners"].tolist(), stream["losers"].tolist(), stream["surfaces"].tolist(),
+        stream["retired"].tolist(),
+        stream["winner_total_matches"].tolist(), stream["loser_total_matches"].tolist(),
+        stream["winner_surface_matches"].tolist(), stream["loser_surface_matches"].tolist(),
+        stream["winner_first_on_surface"].tolist(), stream["loser_first_on_surface"].tolist(),
+        stream["winner_days_inactive"].tolist(), stream["loser_days_inactive"].tolist(),
+    )
+    for (winner, loser, surface, is_retired, winner_matches, loser_matches, winner_surface_matches,
+         loser_surface_matches, winner_first, loser_first, winner_inactive, loser_inactive) in rows:
+        prepare(winner, surface, winner_first, winner_inactive)
+        prepare(loser, surface, loser_first, loser_inactive)
+        winner_blended, winner_blended_gradient = blend(
+            winner, surface, log_weight(winner_matches, winner_surface_matches)
+        )
+        loser_blended, loser_blended_gradient = blend(loser, surface, log_weight(loser_matches, loser_surface_matches))
+
+        expected_winner = 1 / (1 + 10 ** ((loser_blended - winner_blended) / 400))
+        expected_gradient = (
+            expected_winner * (1 - expected_winner) * LOG10_OVER_400
+            * (winner_blended_gradient - loser_blended_gradient)
+        )
+        log_loss -= math.log(expected_winner)
+        log_loss_gradient -= expected_gradient / expected_winner
+
+        retired_factor = 0.5 if is_retired else 1.0
+        for player, matches, sign in ((winner, winner_matches, 1), (loser, loser_matches, -1)):
+            K_factor = retired_factor * k_table[matches]
+            change = sign * K_factor * (1 - expected_winner)
+            change_gradient = sign * retired_factor * (
+                k_gradient[matches] * (1 - expected_winner) - k_table[matches] * expected_gradient
+            )
+            ratings[player] += change
+            rating_gradients[player] += change_gradient
+            surface_ratings[player][surface] += change
+            surface_gradients[player, surface] += change_gradient
+
+    num_matches = max(len(stream["winners"]), 1)
+    return log_loss / num_matches, log_loss_gradient / num_matches
+
+def fit(stream, start=None, iterations=40, learning_rate=0.3, decay_threshold=DECAY_THRESHOLD_DAYS):
+    """Minimise the replay's log loss with Adam in PARAMETER_SCALES units; returns one row per replay."""
+    scales = np.array([PARAMETER_SCALES[name] for name in FIT_PARAMETERS])
+    lower = np.array([PARAMETER_BOUNDS[name][0] for name in FIT_PARAMETERS])
+    upper = np.array([PARAMETER_BOUNDS[name][1] for name in FIT_PARAMETERS])
+    parameters = default_parameters() if start is None else np.asarray(start, dtype=float)
+    first_moment = np.zeros(len(FIT_PARAMETERS))
+    second_moment = np.zeros(len(FIT_PARAMETERS))
+    beta1, beta2, epsilon = 0.9, 0.999, 1e-12
+    history = []
+    for step in range(1, iterations + 1):
+        log_loss, gradient = log_loss_gradient(stream, parameters, decay_threshold)
+        history.append([step, *parameters.tolist(), log_loss, float(np.linalg.norm(gradient * scales))])
+        scaled_gradient = gradient * scales
+        first_moment = beta1 * first_moment + (1 - beta1) * scaled_gradient
+        second_moment = beta2 * second_moment + (1 - beta2) * scaled_gradient ** 2
+        corrected_first = first_moment / (1 - beta1 ** step)
+        corrected_second = second_moment / (1 - beta2 ** step)
+        parameters = parameters - learning_rate * scales * corrected_first / (np.sqrt(corrected_second) + epsilon)
+        parameters = np.clip(parameters, lower, upper)
+    return pd.DataFrame(history, columns=["replay", *FIT_PARAMETERS, "log_loss", "scaled_gradient_norm"])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fit the Elo constants by gradient descent on log loss.")
+    parser.add_argument("--iterations", type=int, default=40, help="Replays to run (default 40)")
+    args = parser.parse_args()
+
+    stream = load_stream()
+    start = time.perf_counter()
+    history = fit(stream, iterations=args.iterations)
+    elapsed = time.perf_counter() - start
+    history.to_csv(RESULTS_FILE, index=False)
+    best = history.loc[history["log_loss"].idxmin()]
+    print(f"Ran {len(history)} replays over {len(stream['winners'])} matches in {elapsed:.2f}s.")
+    print(f"Log loss {history['log_loss'].iloc[0]:.4f} with the current constants, {best['log_loss']:.4f} fitted:")
+    print(best[FIT_PARAMETERS].to_string())
+    print(f"✅ Fit history written to {RESULTS_FILE}.")
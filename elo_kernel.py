@@ -0,0 +1,304 @@
+# Optional Numba-compiled replay loop for EloEngine.process.
+# The kernel runs the same sequential per-match update as the Python loop in
+# elo_engine.py (decay, surface blend, dynamic K, expected score, history-window
+# counts and "avg Elo faced") over pre-encoded integer arrays. Anything the
+# Python loop reads from MatchHistoryStore is handed to the kernel as row
+# pointers: history entries from earlier in the same batch are read back from
+# the kernel's own output, older ones are looked up before the kernel runs.
+#
+# With rank_opponents the kernel also keeps the live rank index: the arrays of
+# RatingRankIndex.to_arrays, updated exactly as RatingRankIndex does.
+#
+# Numba is optional; without it HAVE_NUMBA is False and EloEngine keeps its
+# pure-Python loop.
+import math
+import numpy as np
+from elo_engine import (
+    AVG_ELO_FACED_DECAY, AVG_ELO_FACED_WINDOW, DECAY_RATE, DECAY_THRESHOLD_DAYS, INITIAL_RATING,
+    K_BASE, K_MAX, K_MIN, MATCH_HISTORY_LIMIT, TOP20_ELO, TOP20_RANK, TOP50_ELO, TOP50_RANK,
+)
+
+# Computed by Python: Numba evaluates an integer power by repeated squaring,
+# which can differ from Python's pow in the last bit.
+DROPPED_WEIGHT = AVG_ELO_FACED_DECAY ** AVG_ELO_FACED_WINDOW
+
+try:
+    from numba import njit
+    HAVE_NUMBA = True
+except ImportError:
+    HAVE_NUMBA = False
+
+    def njit(*args, **kwargs):
+        return lambda function: function
+
+@njit(cache=True)
+def round_2_magnitude(a):
+    """round(a, 2) for finite a >= 0, correctly rounded with ties to even like Python's round.
+
+    Element-wise operations only, so the same code rounds a float here and
+    whole arrays in elo_batches.round_2.
+    """
+    # a * 200 == p + e exactly (Dekker's product; 200 needs no splitting)
+    p = a * 200.0
+    c = 134217729.0 * a
+    hi = c - (c - a)
+    e = (hi * 200.0 - p) + (a - hi) * 200.0
+    # k = floor(a * 100): floor(p / 2) is off by at most one while p < 2**53 (a < 4.5e13)
+    k = np.floor(p / 2.0)
+    k = k - ((p - 2.0 * k) + e < 0)
+    k = k + ((p - 2.0 * (k + 1.0)) + e >= 0)
+    # Round up past the exact midpoint k + 0.5, ties to even
+    half = (p - (2.0 * k + 1.0)) + e
+    k = k + ((half > 0) | ((half == 0) & (k % 2 == 1)))
+    return k / 100.0
+
+@njit(cache=True)
+def round_2(x):
+    """Python's round(x, 2), which Numba's round does not match."""
+    if x != x or math.isinf(x):
+        return x
+    return math.copysign(round_2_magnitude(abs(x)), x)
+
+@njit(cache=True)
+def _prepare_player(player, surface, day, ratings, surface_ratings, last_match):
+    if last_match[player] < 0:
+        last_match[player] = day
+    if math.isnan(surface_ratings[player, surface]):
+        surface_ratings[player, surface] = INITIAL_RATING
+    days_inactive = day - last_match[player]
+    if days_inactive > DECAY_THRESHOLD_DAYS:
+        decay_factor = DECAY_RATE ** (days_inactive / 30)
+        if decay_factor != 1.0:
+            ratings[player] *= decay_factor
+            for s in range(surface_ratings.shape[1]):
+                surface_ratings[player, s] *= decay_factor
+
+@njit(cache=True)
+def _blend(overall_elo, surface_elo, total_matches, surface_matches):
+    if total_matches == 0:
+        return overall_elo
+    surface_weight = math.log(1 + surface_matches) / math.log(1 + total_matches)
+    return surface_weight * surface_elo + (1 - surface_weight) * overall_elo
+
+@njit(cache=True)
+def _dynamic_k(matches_played):
+    return max(K_MIN, min(K_MAX, K_BASE * (1 / (1 + 0.1 * matches_played))))
+
+@njit(cache=True)
+def _count_leaderboard_match(leaderboard_counts, player, opponent_elo, opponent_rank, rank_opponents, won, change):
+    if rank_opponents:
+        top50 = 0 < opponent_rank <= TOP50_RANK
+        top20 = 0 < opponent_rank <= TOP20_RANK
+    else:
+        top50 = opponent_elo >= TOP50_ELO
+        top20 = opponent_elo >= TOP20_ELO
+    if top50:
+        leaderboard_counts[player, 2] += change
+        leaderboard_counts[player, 3] += change * won
+        if top20:
+            leaderboard_counts[player, 0] += change
+            leaderboard_counts[player, 1] += change * won
+
+# -------------------------
+# LIVE RANK INDEX (see rating_ranks.RatingRankIndex)
+# -------------------------
+# live_ratings[:rank_state[0]] is the sorted list of live ratings and
+# queue_*[rank_state[1]:rank_state[2]] the expiry deque; entry_days is -1 for
+# players not in the index.
+@njit(cache=True)
+def _rank_remove(live_ratings, rank_state, rating):
+    size = rank_state[0]
+    position = np.searchsorted(live_ratings[:size], rating)
+    for j in range(position, size - 1):
+        live_ratings[j] = live_ratings[j + 1]
+    rank_state[0] = size - 1
+
+@njit(cache=True)
+def _rank_insert(live_ratings, rank_state, rating):
+    size = rank_state[0]
+    position = np.searchsorted(live_ratings[:size], rating, side="right")
+    for j in range(size, position, -1):
+        live_ratings[j] = live_ratings[j - 1]
+    live_ratings[position] = rating
+    rank_state[0] = size + 1
+
+@njit(cache=True)
+def _rank_update(live_ratings, rank_state, entry_ratings, entry_days, queue_days, queue_players, player, rating, day):
+    """RatingRankIndex.update."""
+    if entry_days[player] < 0:
+        _rank_insert(live_ratings, rank_state, rating)
+    elif entry_ratings[player] != rating:
+        _rank_remove(live_ratings, rank_state, entry_ratings[player])
+        _rank_insert(live_ratings, rank_state, rating)
+    if entry_days[player] != day:
+        queue_days[rank_state[2]] = day
+        queue_players[rank_state[2]] = player
+        rank_state[2] += 1
+    entry_ratings[player] = rating
+    entry_days[player] = day
+
+@njit(cache=True)
+def _rank_expire(live_ratings, rank_state, entry_ratings, entry_days, queue_days, queue_players, day, active_days):
+    """RatingRankIndex.expire."""
+    while rank_state[1] < rank_state[2] and day - queue_days[rank_state[1]] > active_days:
+        last_day = queue_days[rank_state[1]]
+        player = queue_players[rank_state[1]]
+        rank_state[1] += 1
+        if entry_days[player] == last_day:
+            _rank_remove(live_ratings, rank_state, entry_ratings[player])
+            entry_days[player] = -1
+
+@njit(cache=True)
+def _rank_of(live_ratings, rank_state, rating):
+    """RatingRankIndex.rank."""
+    size = rank_state[0]
+    return size - np.searchsorted(live_ratings[:size], rating, side="right") + 1
+
+@njit(cache=True)
+def replay_kernel(
+    winners, losers, days, surfaces, retired,
+    window_rows, window_elos, evicted_rows, evicted_elos, evicted_surfaces, evicted_won,
+    ratings, surface_ratings, last_match, match_counts, surface_match_counts, leaderboard_counts,
+    faced_sums, faced_weights,
+    round_blend, record_post_match_elo, exact_avg_elo_faced,
+    pre_match, row_opponent_elos, event_ratings, event_surface_ratings,
+    rank_opponents, active_days, live_ratings, rank_state, entry_ratings, entry_days, queue_days, queue_players,
+    evicted_ranks, row_opponent_ranks,
+):
+    """Replay a batch of matches, updating the state arrays in place.
+
+    Rows 2i and 2i + 1 are match i seen by its winner and loser. For each row,
+    window_rows / evicted_rows point at the row AVG_ELO_FACED_WINDOW /
+    MATCH_HISTORY_LIMIT matches back for that player when it is in this batch
+    (-1 otherwise); window_elos and evicted_* hold the values looked up in the
+    match history for pointers before the batch (NaN / -1 when there is none).
+
+    pre_match is (matches, 9) in PRE_MATCH_COLUMNS order plus expected_winner.
+    row_opponent_elos receives the opponent rating each row adds to the history
+    and event_ratings / event_surface_ratings the post-match ratings per row.
+
+    With rank_opponents, the rank index arrays (RatingRankIndex.to_arrays)
+    are updated in place, row_opponent_ranks receives the opponent rank each
+    row adds to the history and evicted_ranks holds the ranks looked up for
+    evicted entries before the batch.
+    """
+    for i in range(len(winners)):
+        winner = winners[i]
+        loser = losers[i]
+        day = days[i]
+        surface = surfaces[i]
+        _prepare_player(winner, surface, day, ratings, surface_ratings, last_match)
+        _prepare_player(loser, surface, day, ratings, surface_ratings, last_match)
+
+        winner_overall_elo = ratings[winner]
+        loser_overall_elo = ratings[loser]
+        winner_rank = 0
+        loser_rank = 0
+        if rank_opponents:
+            _rank_expire(live_ratings, rank_state, entry_ratings, entry_days, queue_days, queue_players, day, active_days)
+            _rank_update(
+                live_ratings, rank_state, entry_ratings, entry_days, queue_days, queue_players,
+                winner, winner_overall_elo, day,
+            )
+            _rank_update(
+                live_ratings, rank_state, entry_ratings, entry_days, queue_days, queue_players,
+                loser, loser_overall_elo, day,
+            )
+            winner_rank = _rank_of(live_ratings, rank_state, winner_overall_elo)
+            loser_rank = _rank_of(live_ratings, rank_state, loser_overall_elo)
+        winner_surface_elo = surface_ratings[winner, surface]
+        loser_surface_elo = surface_ratings[loser, surface]
+        total_matches_winner = min(match_counts[winner], MATCH_HISTORY_LIMIT)
+        total_matches_loser = min(match_counts[loser], MATCH_HISTORY_LIMIT)
+
+        winner_blended_elo = _blend(
+            winner_overall_elo, winner_surface_elo, total_matches_winner, surface_match_counts[winner, surface]
+        )
+        loser_blended_elo = _blend(
+            loser_overall_elo, loser_surface_elo, total_matches_loser, surface_match_counts[loser, surface]
+        )
+        if round_blend:
+            winner_blended_elo = round_2(winner_blended_elo)
+            loser_blended_elo = round_2(loser_blended_elo)
+
+        K_factor_winner = _dynamic_k(total_matches_winner)
+        K_factor_loser = _dynamic_k(total_matches_loser)
+        if retired[i]:
+            K_factor_winner *= 0.5
+            K_factor_loser *= 0.5
+
+        expected_winner = 1 / (1 + math.pow(10, (loser_blended_elo - winner_blended_elo) / 400))
+        expected_loser = 1 - expected_winner
+
+        pre_match[i, 0] = round_2(winner_overall_elo)
+        pre_match[i, 1] = round_2(winner_surface_elo)
+        pre_match[i, 2] = total_matches_winner
+        pre_match[i, 3] = round_2(faced_sums[winner] / faced_weights[winner] if faced_weights[winner] > 0 else 0.0)
+        pre_match[i, 4] = round_2(loser_overall_elo)
+        pre_match[i, 5] = round_2(loser_surface_elo)
+        pre_match[i, 6] = total_matches_loser
+        pre_match[i, 7] = round_2(faced_sums[loser] / faced_weights[loser] if faced_weights[loser] > 0 else 0.0)
+        pre_match[i, 8] = expected_winner
+
+        ratings[winner] = winner_overall_elo + K_factor_winner * (1 - expected_winner)
+        ratings[loser] = loser_overall_elo + K_factor_loser * (0 - expected_loser)
+        surface_ratings[winner, surface] = winner_surface_elo + K_factor_winner * (1 - expected_winner)
+        surface_ratings[loser, surface] = loser_surface_elo + K_factor_loser * (0 - expected_loser)
+        if rank_opponents:
+            _rank_update(
+                live_ratings, rank_state, entry_ratings, entry_days, queue_days, queue_players,
+                winner, ratings[winner], day,
+            )
+            _rank_update(
+                live_ratings, rank_state, entry_ratings, entry_days, queue_days, queue_players,
+                loser, ratings[loser], day,
+            )
+        event_ratings[2 * i] = ratings[winner]
+        event_ratings[2 * i + 1] = ratings[loser]
+        for s in range(surface_ratings.shape[1]):
+            event_surface_ratings[2 * i, s] = surface_ratings[winner, s]
+            event_surface_ratings[2 * i + 1, s] = surface_ratings[loser, s]
+
+        last_match[winner] = day
+        last_match[loser] = day
+        match_counts[winner] += 1
+        match_counts[loser] += 1
+        surface_match_counts[winner, surface] += 1
+        surface_match_counts[loser, surface] += 1
+        if record_post_match_elo:
+            row_opponent_elos[2 * i] = ratings[loser]
+            row_opponent_elos[2 * i + 1] = ratings[winner]
+        else:
+            row_opponent_elos[2 * i] = loser_overall_elo
+            row_opponent_elos[2 * i + 1] = winner_overall_elo
+        row_opponent_ranks[2 * i] = loser_rank
+        row_opponent_ranks[2 * i + 1] = winner_rank
+
+        # History bookkeeping for both rows, as EloEngine._record_opponent
+        for row in (2 * i, 2 * i + 1):
+            player = winner if row == 2 * i else loser
+            won = 1 if row == 2 * i else 0
+            opponent_elo = row_opponent_elos[row]
+            faced_sums[player] = AVG_ELO_FACED_DECAY * faced_sums[player] + opponent_elo
+            faced_weights[player] = AVG_ELO_FACED_DECAY * faced_weights[player] + 1
+            if exact_avg_elo_faced:
+                dropped_elo = row_opponent_elos[window_rows[row]] if window_rows[row] >= 0 else window_elos[row]
+                if not math.isnan(dropped_elo):
+                    faced_sums[player] -= DROPPED_WEIGHT * dropped_elo
+                    faced_weights[player] -= DROPPED_WEIGHT
+            _count_leaderboard_match(
+                leaderboard_counts, player, opponent_elo, row_opponent_ranks[row], rank_opponents, won, 1
+            )
+            evicted_row = evicted_rows[row]
+            if evicted_row >= 0:
+                surface_match_counts[player, surfaces[evicted_row // 2]] -= 1
+                _count_leaderboard_match(
+                    leaderboard_counts, player, row_opponent_elos[evicted_row], row_opponent_ranks[evicted_row],
+                    rank_opponents, 1 - evicted_row % 2, -1,
+                )
+            elif evicted_surfaces[row] >= 0:
+                surface_match_counts[player, evicted_surfaces[row]] -= 1
+                _count_leaderboard_match(
+                    leaderboard_counts, player, evicted_elos[row], evicted_ranks[row], rank_opponents,
+                    evicted_won[row], -1,
+                )
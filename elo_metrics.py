@@ -0,0 +1,77 @@
+# Streaming quality metrics for Elo predictions.
+# The engine hands over the expected score of every match it processes, and the
+# sums behind log loss, Brier score, accuracy and a reliability histogram are
+# accumulated per chunk with whole-array operations, broken down by surface,
+# year and whether the match ended in a retirement.
+import numpy as np
+import pandas as pd
+from elo_engine import SURFACE_TYPES
+
+RELIABILITY_BINS = 10  # Bins over the favourite's predicted probability, 0.5 to 1.0
+REPORT_COLUMNS = ["group", "key", "matches", "log_loss", "brier", "accuracy", "mean_predicted", "observed"]
+
+class PredictionMetrics:
+    """Running totals for expected_score quality, updated one chunk of matches at a time."""
+
+    def __init__(self):
+        # (group, key) -> [matches, log loss, brier, correct, favourite probability, favourite won]
+        self.totals = {}
+
+    def update(self, expected_winner, surfaces, days, retired):
+        """Add a chunk of matches: the winner's expected score, surface codes, days and retirement flags."""
+        expected_winner = np.asarray(expected_winner, dtype=float)
+        if len(expected_winner) == 0:
+            return
+        favourite = np.maximum(expected_winner, 1 - expected_winner)
+        stats = np.column_stack([
+            np.ones(len(expected_winner)),
+            -np.log(expected_winner),
+            (1 - expected_winner) ** 2,
+            np.where(expected_winner == 0.5, 0.5, expected_winner > 0.5),  # Coin flips count half
+            favourite,
+            expected_winner >= 0.5,
+        ])
+        years = np.asarray(days).astype("datetime64[D]").astype("datetime64[Y]").astype(np.int64) + 1970
+        bins = np.minimum(((favourite - 0.5) * 2 * RELIABILITY_BINS).astype(np.int64), RELIABILITY_BINS - 1)
+        self._accumulate("all", np.zeros(len(stats), dtype=np.int64), stats, lambda key: "all")
+        self._accumulate("surface", np.asarray(surfaces), stats, lambda key: SURFACE_TYPES[key])
+        self._accumulate("year", years, stats, str)
+        self._accumulate("comment", np.asarray(retired, dtype=np.int64), stats,
+                         lambda key: "Retired" if key else "Completed")
+        self._accumulate("reliability", bins, stats, lambda key: (
+            f"{0.5 + key / (2 * RELIABILITY_BINS):.2f}-{0.5 + (key + 1) / (2 * RELIABILITY_BINS):.2f}"
+        ))
+
+    def _accumulate(self, group, keys, stats, label):
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        sums = np.zeros((len(unique_keys), stats.shape[1]))
+        np.add.at(sums, inverse, stats)
+        for key, key_sums in zip(unique_keys.tolist(), sums):
+            name = (group, label(key))
+            self.totals[name] = self.totals.get(name, 0) + key_sums
+
+    def report(self):
+        """One row per group and key with averaged metrics."""
+        rows = []
+        for (group, key), sums in self.totals.items():
+            matches = sums[0]
+            rows.append([
+                group, key, int(matches), sums[1] / matches, sums[2] / matches, sums[3] / matches,
+                sums[4] / matches, sums[5] / matches,
+            ])
+        report = pd.DataFrame(rows, columns=REPORT_COLUMNS)
+        group_order = {"all": 0, "surface": 1, "year": 2, "comment": 3, "reliability": 4}
+        report = report.sort_values(["group", "key"], key=lambda column: (
+            column.map(group_order) if column.name == "group" else column
+        ))
+        return report.round(4).reset_index(drop=True)
+
+    def summary(self):
+        """One-line overall summary for script output."""
+        matches, log_loss, brier, correct = self.totals.get(("all", "all"), np.zeros(6))[:4]
+        if not matches:
+            return "No matches scored."
+        return (
+            f"{int(matches)} matches: log loss {log_loss / matches:.4f}, "
+            f"Brier {brier / matches:.4f}, accuracy {correct / matches:.1%}"
+        )
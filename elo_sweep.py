@@ -0,0 +1,154 @@
+# Runs many Elo configurations in a single pass over a pre-encoded match stream.
+# Ratings carry an extra configuration axis, so each match is one set of NumPy
+# operations across every configuration and hundreds of configurations take
+# about as long to evaluate as a few.
+import itertools
+import time
+import numpy as np
+import pandas as pd
+import elo_engine
+from elo_engine import INITIAL_RATING, MATCH_HISTORY_LIMIT, SURFACE_TYPES
+from external_sort import MATCH_COLUMNS, prepare_matches
+from match_stream import encode_match_stream
+
+SURFACE_WEIGHTINGS = ["log", "linear", "none"]  # How surface and overall Elo are blended
+SWEEP_PARAMETERS = ["K_BASE", "K_MIN", "K_MAX", "DECAY_RATE", "DECAY_THRESHOLD_DAYS", "SURFACE_WEIGHTING"]
+RESULTS_FILE = "elo_sweep_results.csv"
+
+# Grid evaluated when the script is run directly
+DEFAULT_GRID = {
+    "K_BASE": [24, 32, 40],
+    "K_MIN": [8, 12, 16],
+    "K_MAX": [40, 50],
+    "DECAY_RATE": [0.99, 0.995, 1.0],
+    "DECAY_THRESHOLD_DAYS": [90, 180, 365],
+    "SURFACE_WEIGHTING": SURFACE_WEIGHTINGS,
+}
+
+def default_config():
+    """The configuration create_elo_ratings.py currently uses."""
+    config = {parameter: getattr(elo_engine, parameter) for parameter in SWEEP_PARAMETERS[:-1]}
+    config["SURFACE_WEIGHTING"] = "log"
+    return config
+
+def parameter_grid(**values):
+    """Every combination of the given parameter values; other parameters keep their defaults."""
+    unknown = set(values) - set(SWEEP_PARAMETERS)
+    if unknown:
+        raise ValueError(f"Unknown sweep parameters: {sorted(unknown)}")
+    names = list(values)
+    return [
+        {**default_config(), **dict(zip(names, combination))}
+        for combination in itertools.product(*(values[name] for name in names))
+    ]
+
+def surface_weights(total_matches, surface_matches):
+    """Surface weight for every match under each scheme in SURFACE_WEIGHTINGS, shape (matches, schemes)."""
+    total = total_matches.astype(float)
+    surface = surface_matches.astype(float)
+    played = total > 0
+    safe_total = np.where(played, total, 1)
+    return np.column_stack([
+        np.where(played, np.log(1 + surface) / np.log(1 + safe_total), 0.0),
+        np.where(played, surface / safe_total, 0.0),
+        np.zeros(len(total)),
+    ])
+
+def sweep(stream, configs):
+    """Replay the stream once for all configs; returns per-configuration log loss and Brier score."""
+    num_configs = len(configs)
+    k_base = np.array([config["K_BASE"] for config in configs], dtype=float)
+    k_min = np.array([config["K_MIN"] for config in configs], dtype=float)
+    k_max = np.array([config["K_MAX"] for config in configs], dtype=float)
+    decay_rate = np.array([config["DECAY_RATE"] for config in configs], dtype=float)
+    decay_threshold = np.array([config["DECAY_THRESHOLD_DAYS"] for config in configs], dtype=float)
+    scheme = np.array([SURFACE_WEIGHTINGS.index(config["SURFACE_WEIGHTING"]) for config in configs])
+
+    # K-factor for every capped match count, per configuration
+    matches_played = np.arange(MATCH_HISTORY_LIMIT + 1, dtype=float)[:, None]
+    k_table = np.clip(k_base / (1 + 0.1 * matches_played), k_min, k_max)
+    min_threshold = decay_threshold.min()
+
+    num_players = len(stream["player_names"])
+    ratings = np.full((num_players, num_configs), float(INITIAL_RATING))
+    surface_ratings = np.full((num_players, len(SURFACE_TYPES), num_configs), np.nan)
+    winner_weights = surface_weights(stream["winner_total_matches"], stream["winner_surface_matches"])
+    loser_weights = surface_weights(stream["loser_total_matches"], stream["loser_surface_matches"])
+    log_loss = np.zeros(num_configs)
+    brier = np.zeros(num_configs)
+
+    def prepare(player, surface, first_on_surface, days_inactive):
+        if first_on_surface:
+            surface_ratings[player, surface] = INITIAL_RATING
+        if days_inactive > min_threshold:
+            decay_factor = np.where(days_inactive > decay_threshold, decay_rate ** (days_inactive / 30), 1.0)
+            ratings[player] *= decay_factor
+            surface_ratings[player] *= decay_factor
+        return ratings[player], surface_ratings[player, surface]
+
+    rows = zip(
+        stream["winners"].tolist(), stream["losers"].tolist(), stream["surfaces"].tolist(),
+        stream["retired"].tolist(),
+        stream["winner_total_matches"].tolist(), stream["loser_total_matches"].tolist(),
+        stream["winner_first_on_surface"].tolist(), stream["loser_first_on_surface"].tolist(),
+        stream["winner_days_inactive"].tolist(), stream["loser_days_inactive"].tolist(),
+    )
+    for i, (winner, loser, surface, is_retired, winner_matches, loser_matches,
+            winner_first, loser_first, winner_inactive, loser_inactive) in enumerate(rows):
+        winner_rating, winner_surface_rating = prepare(winner, surface, winner_first, winner_inactive)
+        loser_rating, loser_surface_rating = prepare(loser, surface, loser_first, loser_inactive)
+
+        winner_weight = winner_weights[i][scheme]
+        loser_weight = loser_weights[i][scheme]
+        winner_blended = winner_weight * winner_surface_rating + (1 - winner_weight) * winner_rating
+        loser_blended = loser_weight * loser_surface_rating + (1 - loser_weight) * loser_rating
+        expected_winner = 1 / (1 + 10 ** ((loser_blended - winner_blended) / 400))
+
+        K_factor_winner = k_table[winner_matches]
+        K_factor_loser = k_table[loser_matches]
+        if is_retired:
+            K_factor_winner = K_factor_winner * 0.5
+            K_factor_loser = K_factor_loser * 0.5
+        winner_change = K_factor_winner * (1 - expected_winner)
+        loser_change = K_factor_loser * (1 - expected_winner)
+        ratings[winner] = winner_rating + winner_change
+        ratings[loser] = loser_rating - loser_change
+        surface_ratings[winner, surface] = winner_surface_rating + winner_change
+        surface_ratings[loser, surface] = loser_surface_rating - loser_change
+
+        log_loss -= np.log(expected_winner)
+        brier += (1 - expected_winner) ** 2
+
+    num_matches = max(len(stream["winners"]), 1)
+    results = pd.DataFrame(configs, columns=SWEEP_PARAMETERS)
+    results["log_loss"] = log_loss / num_matches
+    results["brier"] = brier / num_matches
+    return results
+
+def load_stream(file_path="tennis_all.csv"):
+    """Read and encode a tennis-data CSV for sweep(); exits if the file is missing.
+
+    Matches are in the stable date order create_elo_ratings.py replays them in.
+    """
+    try:
+        matches = prepare_matches(pd.read_csv(file_path, usecols=MATCH_COLUMNS))
+    except FileNotFoundError:
+        print(f"Error: {file_path} not found.")
+        exit(1)
+    matches = matches.sort_values("day", kind="stable")
+    return encode_match_stream(
+        matches["winner"], matches["loser"], matches["day"], matches["surface"], matches["retired"]
+    )
+
+if __name__ == "__main__":
+    stream = load_stream()
+
+    configs = parameter_grid(**DEFAULT_GRID)
+    start = time.perf_counter()
+    results = sweep(stream, configs)
+    elapsed = time.perf_counter() - start
+    results = results.sort_values("log_loss").reset_index(drop=True)
+    results.to_csv(RESULTS_FILE, index=False)
+    print(f"Evaluated {len(configs)} configurations over {len(stream['winners'])} matches in {elapsed:.2f}s.")
+    print(results.head(10).to_string())
+    print(f"✅ Sweep results written to {RESULTS_FILE}.")
@@ -0,0 +1,103 @@
+# Out-of-core input for the Elo replay.
+# A tennis-data CSV too large for memory is read in chunks of rows; each chunk
+# is filtered to rated matches, sorted by date and written to a temporary run
+# file, and the runs are then merged back in date order a block at a time
+# (in several passes when there are more than MERGE_FAN_IN runs).
+# Memory is bounded by the chunk size however large the input is, and the
+# merged stream is the stable date sort of the file (file order within a day),
+# the same order the in-memory path uses.
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+from elo_engine import SURFACE_TYPES, encode_surfaces, to_days
+
+MATCH_COLUMNS = ["Date", "Winner", "Loser", "Surface", "Comment"]  # tennis-data columns the replay needs
+MERGE_FAN_IN = 64  # Most runs merged (and open) at once; more runs are merged in several passes
+
+def prepare_matches(df):
+    """Rated matches (no walkovers, rated surfaces) as day / winner / loser / surface code / retired columns."""
+    comments = df["Comment"].astype(str)
+    rated = (df["Surface"].isin(SURFACE_TYPES) & ~comments.str.contains("Walkover", regex=False)).to_numpy()
+    df = df[rated]
+    return pd.DataFrame({
+        "day": to_days(pd.to_datetime(df["Date"], dayfirst=True)),
+        "winner": df["Winner"].to_numpy(),
+        "loser": df["Loser"].to_numpy(),
+        "surface": encode_surfaces(df["Surface"]),
+        "retired": comments[rated].str.contains("Retired", regex=False).to_numpy(),
+    })
+
+def write_sorted_runs(path, chunk_rows, directory):
+    """Split the CSV into date-sorted run files of at most chunk_rows input rows; returns their paths."""
+    run_paths = []
+    for index, chunk in enumerate(pd.read_csv(path, usecols=MATCH_COLUMNS, chunksize=chunk_rows)):
+        run = prepare_matches(chunk).sort_values("day", kind="stable")
+        if not len(run):
+            continue
+        run_path = os.path.join(directory, f"run_{index:05d}.csv")
+        run.to_csv(run_path, index=False)
+        run_paths.append(run_path)
+    return run_paths
+
+def merge_runs(run_paths, block_rows):
+    """Merge date-sorted runs, yielding blocks of matches in (day, run, row) order.
+
+    Every run is read block_rows rows at a time and buffered as column arrays.
+    A block holds the buffered matches before the smallest last day any
+    unfinished run has buffered, since no run can still produce an earlier
+    match; runs that end on that day are then read further.
+    """
+    readers = [
+        pd.read_csv(run_path, chunksize=block_rows, dtype={"winner": str, "loser": str}) for run_path in run_paths
+    ]
+    buffers = [{column: chunk[column].to_numpy() for column in chunk} for chunk in map(next, readers)]
+    unfinished = [True] * len(readers)
+    while True:
+        frontier = min(
+            (int(buffer["day"][-1]) for buffer, running in zip(buffers, unfinished) if running), default=None
+        )
+        parts = []
+        for run, buffer in enumerate(buffers):
+            ready = len(buffer["day"]) if frontier is None else int(np.searchsorted(buffer["day"], frontier))
+            parts.append({column: values[:ready] for column, values in buffer.items()})
+            buffers[run] = {column: values[ready:] for column, values in buffer.items()}
+        if parts:
+            block = pd.DataFrame({column: np.concatenate([part[column] for part in parts]) for column in parts[0]})
+            if len(block):
+                yield block.iloc[np.argsort(block["day"].to_numpy(), kind="stable")].reset_index(drop=True)
+        if frontier is None:
+            return
+        for run, buffer in enumerate(buffers):
+            if unfinished[run] and int(buffer["day"][-1]) == frontier:
+                chunk = next(readers[run], None)
+                if chunk is None:
+                    unfinished[run] = False
+                else:
+                    buffers[run] = {column: np.concatenate([values, chunk[column].to_numpy()])
+                                    for column, values in buffer.items()}
+
+def merge_pass(run_paths, chunk_rows, directory, pass_index):
+    """Merge consecutive groups of MERGE_FAN_IN runs into longer runs; returns the new run paths."""
+    merged_paths = []
+    for group_start in range(0, len(run_paths), MERGE_FAN_IN):
+        group = run_paths[group_start:group_start + MERGE_FAN_IN]
+        merged_path = os.path.join(directory, f"merged_{pass_index}_{len(merged_paths):05d}.csv")
+        header = True
+        for block in merge_runs(group, max(1, chunk_rows // len(group))):
+            block.to_csv(merged_path, mode="a", header=header, index=False)
+            header = False
+        for run_path in group:
+            os.remove(run_path)
+        merged_paths.append(merged_path)
+    return merged_paths
+
+def sorted_match_blocks(path, chunk_rows):
+    """Rated matches of the CSV at path in date order, in blocks, holding about chunk_rows rows in memory."""
+    with tempfile.TemporaryDirectory(prefix="elo_runs_") as directory:
+        run_paths = write_sorted_runs(path, chunk_rows, directory)
+        pass_index = 0
+        while len(run_paths) > MERGE_FAN_IN:
+            run_paths = merge_pass(run_paths, chunk_rows, directory, pass_index)
+            pass_index += 1
+        yield from merge_runs(run_paths, max(1, chunk_rows // max(1, len(run_paths))))
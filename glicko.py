@@ -0,0 +1,175 @@
+# Glicko-2 ratings updated one rating period at a time.
+# Matches are grouped into weekly rating periods. Every player's rating is fixed
+# for the whole period, so all of a period's updates are computed together with
+# whole-array operations instead of one match after another. Alongside the rating
+# each player carries a rating deviation (RD) that grows while they are inactive
+# and shrinks as they play.
+import numpy as np
+from elo_engine import PlayerIndex
+
+# Glicko-2 Constants
+GLICKO_INITIAL_RATING = 1500
+GLICKO_INITIAL_RD = 350  # Also the ceiling an inactive player's RD grows back to
+GLICKO_INITIAL_VOLATILITY = 0.06
+GLICKO_TAU = 0.5  # Constrains how fast volatility can change
+GLICKO_SCALE = 173.7178  # Glicko-2 internal scale per rating point
+GLICKO_TOLERANCE = 1e-6  # Convergence tolerance of the volatility iteration
+RATING_PERIOD_DAYS = 7  # One period per calendar week
+RETIRED_MATCH_WEIGHT = 0.5  # Retirements count half, like the halved Elo K-factor
+
+# Pre-match values returned for every processed match, named after the
+# matched_atp_records columns they are written to.
+GLICKO_PRE_MATCH_COLUMNS = [
+    "winner_glicko_rating",
+    "winner_glicko_rd",
+    "loser_glicko_rating",
+    "loser_glicko_rd",
+]
+
+def rating_periods(days):
+    """Week number (Monday to Sunday) of each day since the epoch, which was a Thursday."""
+    return (np.asarray(days, dtype=np.int64) + 3) // RATING_PERIOD_DAYS
+
+def rating_period_start(period):
+    """First day (the Monday) of a rating period."""
+    return period * RATING_PERIOD_DAYS - 3
+
+def glicko_g(phi):
+    """Glicko-2 g(phi): discounts a result by the opponent's uncertainty."""
+    return 1 / np.sqrt(1 + 3 * phi ** 2 / np.pi ** 2)
+
+def update_volatility(sigma, phi, v, delta):
+    """New volatility for each player (Glicko-2 step 5, Illinois method), vectorized over players."""
+    a = np.log(sigma ** 2)
+    phi_squared = phi ** 2
+
+    def f(x, players=slice(None)):
+        ex = np.exp(x)
+        variance = phi_squared[players] + v[players]
+        return (
+            ex * (delta[players] ** 2 - variance - ex) / (2 * (variance + ex) ** 2)
+            - (x - a[players]) / GLICKO_TAU ** 2
+        )
+
+    A = a.copy()
+    large_delta = delta ** 2 > phi_squared + v
+    B = np.where(large_delta, np.log(np.maximum(delta ** 2 - phi_squared - v, 1e-300)), a - GLICKO_TAU)
+    searching = np.flatnonzero(~large_delta & (f(B) < 0))
+    while len(searching):
+        B[searching] -= GLICKO_TAU
+        searching = searching[f(B[searching], searching) < 0]
+
+    fA = f(A)
+    fB = f(B)
+    active = np.flatnonzero(np.abs(B - A) > GLICKO_TOLERANCE)
+    while len(active):
+        C = A[active] + (A[active] - B[active]) * fA[active] / (fB[active] - fA[active])
+        fC = f(C, active)
+        crossed = fC * fB[active] <= 0
+        A[active] = np.where(crossed, B[active], A[active])
+        fA[active] = np.where(crossed, fB[active], fA[active] / 2)
+        B[active] = C
+        fB[active] = fC
+        active = active[np.abs(B[active] - A[active]) > GLICKO_TOLERANCE]
+    return np.exp(A / 2)
+
+class GlickoModel(PlayerIndex):
+    """Glicko-2 ratings for dense player ids, processed one rating period at a time."""
+
+    def __init__(self):
+        super().__init__()
+        self.mu = np.empty(0)
+        self.phi = np.empty(0)
+        self.sigma = np.empty(0)
+        self.last_period = np.empty(0, dtype=np.int64)  # -1 until a player's first period
+
+    def _add_players(self, names):
+        count = len(names)
+        self.mu = np.concatenate([self.mu, np.zeros(count)])
+        self.phi = np.concatenate([self.phi, np.full(count, GLICKO_INITIAL_RD / GLICKO_SCALE)])
+        self.sigma = np.concatenate([self.sigma, np.full(count, GLICKO_INITIAL_VOLATILITY)])
+        self.last_period = np.concatenate([self.last_period, np.full(count, -1, dtype=np.int64)])
+
+    def checkpoint_arrays(self):
+        """A copy of the state as named arrays, to be saved next to an EloEngine checkpoint (see from_checkpoint)."""
+        return {
+            "glicko_player_names": np.array(self.player_names, dtype=str),
+            "glicko_mu": self.mu.copy(),
+            "glicko_phi": self.phi.copy(),
+            "glicko_sigma": self.sigma.copy(),
+            "glicko_last_period": self.last_period.copy(),
+        }
+
+    @classmethod
+    def from_checkpoint(cls, checkpoint):
+        """Rebuild a model from checkpoint_arrays, e.g. an open np.load file."""
+        glicko = cls()
+        glicko.player_names = checkpoint["glicko_player_names"].tolist()
+        glicko.player_index = {name: player_id for player_id, name in enumerate(glicko.player_names)}
+        glicko.mu = checkpoint["glicko_mu"]
+        glicko.phi = checkpoint["glicko_phi"]
+        glicko.sigma = checkpoint["glicko_sigma"]
+        glicko.last_period = checkpoint["glicko_last_period"]
+        return glicko
+
+    def ratings(self):
+        """Current ratings and RDs on the Glicko scale."""
+        return GLICKO_INITIAL_RATING + GLICKO_SCALE * self.mu, GLICKO_SCALE * self.phi
+
+    def process(self, winners, losers, periods, retired):
+        """Rate matches sorted by period; returns pre-match ratings and RDs keyed by GLICKO_PRE_MATCH_COLUMNS.
+
+        Pre-match values are the ratings at the start of each match's period,
+        since every match in a period is rated against the same snapshot.
+        """
+        winners = np.asarray(winners, dtype=np.int64)
+        losers = np.asarray(losers, dtype=np.int64)
+        periods = np.asarray(periods, dtype=np.int64)
+        weights = np.where(np.asarray(retired, dtype=bool), RETIRED_MATCH_WEIGHT, 1.0)
+        pre_match = {column: np.empty(len(winners)) for column in GLICKO_PRE_MATCH_COLUMNS}
+        if not len(periods):
+            return pre_match
+        boundaries = np.flatnonzero(np.diff(periods)) + 1
+        for start, end in zip(np.r_[0, boundaries], np.r_[boundaries, len(periods)]):
+            self._process_period(
+                int(periods[start]), winners[start:end], losers[start:end], weights[start:end],
+                pre_match, slice(start, end),
+            )
+        return pre_match
+
+    def _process_period(self, period, winners, losers, weights, pre_match, rows):
+        players, local = np.unique(np.concatenate([winners, losers]), return_inverse=True)
+        local_winners, local_losers = local[:len(winners)], local[len(winners):]
+
+        # Grow RD for the periods each player sat out since their last one (Glicko-2 step 6)
+        mu = self.mu[players]
+        sigma = self.sigma[players]
+        missed = np.where(self.last_period[players] >= 0, period - self.last_period[players] - 1, 0)
+        phi = np.minimum(
+            np.sqrt(self.phi[players] ** 2 + missed * sigma ** 2), GLICKO_INITIAL_RD / GLICKO_SCALE
+        )
+
+        pre_match["winner_glicko_rating"][rows] = GLICKO_INITIAL_RATING + GLICKO_SCALE * mu[local_winners]
+        pre_match["winner_glicko_rd"][rows] = GLICKO_SCALE * phi[local_winners]
+        pre_match["loser_glicko_rating"][rows] = GLICKO_INITIAL_RATING + GLICKO_SCALE * mu[local_losers]
+        pre_match["loser_glicko_rd"][rows] = GLICKO_SCALE * phi[local_losers]
+
+        # One row per (player, opponent) result in the period (steps 3 and 4)
+        own = np.concatenate([local_winners, local_losers])
+        opponent = np.concatenate([local_losers, local_winners])
+        score = np.concatenate([np.ones(len(winners)), np.zeros(len(losers))])
+        result_weights = np.concatenate([weights, weights])
+        g = glicko_g(phi[opponent])
+        expected = 1 / (1 + np.exp(-g * (mu[own] - mu[opponent])))
+        v = 1 / np.bincount(own, result_weights * g ** 2 * expected * (1 - expected), minlength=len(players))
+        improvement = np.bincount(own, result_weights * g * (score - expected), minlength=len(players))
+        delta = v * improvement
+
+        # Steps 5 to 7
+        new_sigma = update_volatility(sigma, phi, v, delta)
+        phi_star = np.sqrt(phi ** 2 + new_sigma ** 2)
+        new_phi = 1 / np.sqrt(1 / phi_star ** 2 + 1 / v)
+        self.mu[players] = mu + new_phi ** 2 * improvement
+        self.phi[players] = new_phi
+        self.sigma[players] = new_sigma
+        self.last_period[players] = period
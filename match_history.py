@@ -0,0 +1,118 @@
+# Per-player match history for the Elo engine, kept in columnar ring buffers.
+# Each player gets a NumPy structured array that grows by doubling until it
+# reaches the history limit and from then on overwrites its oldest entry, so
+# appends never copy the history and memory per player is bounded.
+import numpy as np
+
+HISTORY_DTYPE = np.dtype([
+    ("opponent", np.int32),  # Opponent player id
+    ("opponent_elo", np.float64),
+    ("surface", np.int8),  # Surface code
+    ("won", np.int8),  # 1 for a win, 0 for a loss
+    ("opponent_rank", np.int32),  # Opponent's live rank at match time, 0 when not ranked
+])
+INITIAL_CAPACITY = 16
+
+class MatchHistoryStore:
+    """Fixed-capacity match history for every player, oldest entry first."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.buffers = []
+        self.starts = []  # Index of the oldest entry once a buffer has wrapped
+        self.lengths = []
+
+    def add_players(self, count):
+        self.buffers.extend(np.empty(0, dtype=HISTORY_DTYPE) for _ in range(count))
+        self.starts.extend([0] * count)
+        self.lengths.extend([0] * count)
+
+    def __len__(self):
+        return len(self.buffers)
+
+    def length(self, player):
+        return self.lengths[player]
+
+    def append(self, player, opponent, opponent_elo, surface, won, opponent_rank=0):
+        """Add a match to the player's history; returns the evicted entry once the limit is reached."""
+        buffer = self.buffers[player]
+        length = self.lengths[player]
+        capacity = len(buffer)
+        if length == capacity and capacity < self.limit:
+            # Still growing: entries are contiguous from index 0
+            grown = np.empty(min(self.limit, max(INITIAL_CAPACITY, 2 * capacity)), dtype=HISTORY_DTYPE)
+            grown[:length] = buffer
+            self.buffers[player] = buffer = grown
+            capacity = len(buffer)
+        if length < capacity:
+            buffer[length] = (opponent, opponent_elo, surface, won, opponent_rank)
+            self.lengths[player] = length + 1
+            return None
+        start = self.starts[player]
+        evicted = buffer[start].copy()
+        buffer[start] = (opponent, opponent_elo, surface, won, opponent_rank)
+        self.starts[player] = (start + 1) % capacity
+        return evicted
+
+    def extend(self, player, entries):
+        """Append several matches (a HISTORY_DTYPE array, oldest first) to the player's history."""
+        self._set_entries(player, np.concatenate((self.entries(player), entries))[-self.limit:])
+
+    def _set_entries(self, player, entries):
+        capacity = INITIAL_CAPACITY
+        while capacity < len(entries):
+            capacity *= 2
+        buffer = np.empty(min(self.limit, capacity) if len(entries) else 0, dtype=HISTORY_DTYPE)
+        buffer[:len(entries)] = entries
+        self.buffers[player] = buffer
+        self.starts[player] = 0
+        self.lengths[player] = len(entries)
+
+    def entries(self, player):
+        """All stored matches for the player, oldest first."""
+        buffer = self.buffers[player]
+        start = self.starts[player]
+        if start == 0:
+            return buffer[:self.lengths[player]]
+        return np.concatenate((buffer[start:], buffer[:start]))
+
+    def recent(self, player, count):
+        """The player's last count matches, oldest first."""
+        length = self.lengths[player]
+        count = min(count, length)
+        buffer = self.buffers[player]
+        start = self.starts[player]
+        if start == 0:
+            return buffer[length - count:length]
+        # Wrapped buffers are full and their newest entry sits just before start
+        if count <= start:
+            return buffer[start - count:start]
+        return np.concatenate((buffer[len(buffer) - (count - start):], buffer[:start]))
+
+    def opponent_elo_back(self, player, back):
+        """Opponent Elo of the match back places from the end (1 = newest), or None."""
+        length = self.lengths[player]
+        if back > length:
+            return None
+        buffer = self.buffers[player]
+        return float(buffer[(self.starts[player] + length - back) % len(buffer)]["opponent_elo"])
+
+    # -------------------------
+    # SERIALIZATION
+    # -------------------------
+    def to_arrays(self):
+        """Flatten the store into a lengths array plus one array of entries."""
+        lengths = np.array(self.lengths, dtype=np.int64)
+        if not self.buffers:
+            return lengths, np.empty(0, dtype=HISTORY_DTYPE)
+        return lengths, np.concatenate([self.entries(player) for player in range(len(self))])
+
+    @classmethod
+    def from_arrays(cls, limit, lengths, entries):
+        store = cls(limit)
+        store.add_players(len(lengths))
+        offset = 0
+        for player, length in enumerate(lengths.tolist()):
+            store._set_entries(player, entries[offset:offset + length])
+            offset += length
+        return store
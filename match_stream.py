@@ -0,0 +1,71 @@
+# Pre-encoded match stream for replays that run many rating configurations.
+# Everything about a match that doesn't depend on the ratings themselves (match
+# counts, surface counts, days since the last match) is computed here once with
+# whole-column NumPy operations, so rating models only carry the ratings.
+import numpy as np
+import pandas as pd
+from elo_engine import MATCH_HISTORY_LIMIT, SURFACE_TYPES
+
+def encode_match_stream(winner_names, loser_names, days, surfaces, retired):
+    """Encode date-ordered matches (walkovers and unrated surfaces already removed).
+
+    days and surfaces are integer days and surface codes, as external_sort.prepare_matches gives them.
+
+    Returns a dict of equal-length arrays. Match and surface counts are the
+    pre-match values the Elo engine sees, i.e. limited to the last
+    MATCH_HISTORY_LIMIT matches of each player.
+    """
+    pairs = np.column_stack([np.asarray(winner_names, dtype=object), np.asarray(loser_names, dtype=object)])
+    codes, player_names = pd.factorize(pairs.ravel())
+    ids = codes.reshape(-1, 2)
+    surfaces = np.asarray(surfaces, dtype=np.int64)
+    days = np.asarray(days, dtype=np.int64)
+    num_matches = len(ids)
+
+    # One row per (match, side), sorted by player and then match order
+    players = ids.T.ravel()
+    match_index = np.tile(np.arange(num_matches), 2)
+    order = np.lexsort((match_index, players))
+    sorted_players = players[order]
+    sorted_surfaces = surfaces[match_index[order]]
+    sorted_days = days[match_index[order]]
+
+    new_player = np.ones(len(order), dtype=bool)
+    new_player[1:] = sorted_players[1:] != sorted_players[:-1]
+    group_start = np.maximum.accumulate(np.where(new_player, np.arange(len(order)), 0))
+    position = np.arange(len(order)) - group_start
+
+    # Matches on each surface strictly before each row, per player
+    played = np.zeros((len(order), len(SURFACE_TYPES)), dtype=np.int64)
+    played[np.arange(len(order)), sorted_surfaces] = 1
+    before = np.cumsum(played, axis=0) - played
+    before -= before[group_start]
+    own_before = before[np.arange(len(order)), sorted_surfaces]
+    window_start = group_start + np.maximum(0, position - MATCH_HISTORY_LIMIT)
+    surface_matches = own_before - before[window_start, sorted_surfaces]
+
+    days_inactive = np.zeros(len(order), dtype=np.int64)
+    days_inactive[1:] = sorted_days[1:] - sorted_days[:-1]
+    days_inactive[new_player] = 0
+
+    def by_side(values):
+        unsorted = np.empty_like(values)
+        unsorted[order] = values
+        return unsorted[:num_matches], unsorted[num_matches:]
+
+    stream = {
+        "player_names": list(player_names),
+        "winners": ids[:, 0],
+        "losers": ids[:, 1],
+        "days": days,
+        "surfaces": surfaces,
+        "retired": np.asarray(retired, dtype=bool),
+    }
+    for name, values in (
+        ("total_matches", np.minimum(position, MATCH_HISTORY_LIMIT)),
+        ("surface_matches", surface_matches),
+        ("first_on_surface", own_before == 0),
+        ("days_inactive", days_inactive),
+    ):
+        stream[f"winner_{name}"], stream[f"loser_{name}"] = by_side(values)
+    return stream
@@ -0,0 +1,79 @@
+# Point-in-time Elo lookups from the engine's rating event log.
+# Every match leaves one event per player with the post-match overall and surface
+# ratings. Events are sorted by (player, day), so "rating of X on date D" is a
+# binary search for the last event on or before D plus the inactivity decay from
+# that event to D, without touching Postgres.
+#
+# Usage: python3 rating_lookup.py "Jannik Sinner" 2024-06-01 [--surface Clay]
+import argparse
+import numpy as np
+from elo_engine import ELO_CHECKPOINT_FILE, EloEngine, SURFACE_CODES, SURFACE_TYPES, calculate_decay_factors
+
+class RatingLookup:
+    """Answers "what was this player's Elo on this date" from a date-sorted event log."""
+
+    def __init__(self, player_names, players, days, ratings, surface_ratings):
+        self.player_names = list(player_names)
+        self.player_index = {name: player_id for player_id, name in enumerate(self.player_names)}
+        order = np.lexsort((np.arange(len(players)), days, players))  # Replay order breaks same-day ties
+        self.players = np.asarray(players, dtype=np.int64)[order]
+        self.days = np.asarray(days, dtype=np.int64)[order]
+        self.ratings = np.asarray(ratings, dtype=float)[order]
+        self.surface_ratings = np.asarray(surface_ratings, dtype=float)[order]
+        self.day_span = int(self.days.max()) + 1 if len(self.days) else 1
+        self.keys = self.players * self.day_span + self.days
+
+    @classmethod
+    def from_engine(cls, elo):
+        """Build a lookup from an EloEngine created with record_events=True."""
+        if not elo.record_events:
+            raise ValueError("EloEngine was created without record_events=True.")
+        return cls(elo.player_names, *elo.rating_event_arrays())
+
+    @classmethod
+    def from_checkpoint(cls, path=ELO_CHECKPOINT_FILE):
+        elo, _ = EloEngine.load(path)
+        return cls.from_engine(elo)
+
+    def ratings_at(self, player_names, dates, surface=None):
+        """Vectorized lookup: one rating per (player, date) pair, NaN before a player's first match.
+
+        With a surface, the surface rating is returned, falling back to the
+        overall rating for players who had not played on that surface yet.
+        """
+        player_ids = np.array([self.player_index.get(name, -1) for name in np.atleast_1d(player_names)], dtype=np.int64)
+        query_days = np.asarray(np.atleast_1d(dates), dtype="datetime64[D]").astype(np.int64)
+        query_days = np.broadcast_to(query_days, player_ids.shape)
+        # Clamp to the key range so dates after the last event still land on the player's events
+        clamped_days = np.minimum(query_days, self.day_span - 1)
+        positions = np.searchsorted(self.keys, player_ids * self.day_span + clamped_days, side="right") - 1
+        found = (player_ids >= 0) & (positions >= 0)
+        found[found] &= self.players[positions[found]] == player_ids[found]
+
+        result = np.full(len(player_ids), np.nan)
+        events = positions[found]
+        ratings = self.ratings[events]
+        if surface is not None:
+            surface_ratings = self.surface_ratings[events, SURFACE_CODES[surface]]
+            ratings = np.where(np.isnan(surface_ratings), ratings, surface_ratings)
+        result[found] = ratings * calculate_decay_factors(query_days[found] - self.days[events])
+        return result
+
+    def rating_at(self, player_name, date, surface=None):
+        """Rating of a single player on a date (see ratings_at)."""
+        return float(self.ratings_at([player_name], [date], surface)[0])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Look up a player's Elo on a given date.")
+    parser.add_argument("player", help='Player name as stored in matched_atp_records, e.g. "Jannik Sinner"')
+    parser.add_argument("date", help="Date in YYYY-MM-DD format")
+    parser.add_argument("--surface", choices=SURFACE_TYPES, help="Return the surface rating instead")
+    args = parser.parse_args()
+
+    lookup = RatingLookup.from_checkpoint()
+    rating = lookup.rating_at(args.player, args.date, args.surface)
+    label = f"{args.surface} Elo" if args.surface else "Overall Elo"
+    if np.isnan(rating):
+        print(f"No rating for {args.player} on {args.date}.")
+    else:
+        print(f"{args.player} {label} on {args.date}: {rating:.2f}")
@@ -0,0 +1,129 @@
+# Rating models run side by side by run_rating_models.py.
+# The runner decodes the date-ordered match stream once (shared player ids,
+# days, surface codes, retirement flags and any stat columns a model asks for)
+# and hands the same arrays to every registered model a chunk at a time. A
+# model keeps its own state and returns its pre-match values per match,
+# always including expected_winner, the probability it gave the winner.
+#
+# To add a model, subclass RatingModel and decorate it with @register_model.
+import numpy as np
+from elo_engine import INITIAL_RATING, K_BASE, PRE_MATCH_COLUMNS, EloEngine, expected_score
+from glicko import GLICKO_PRE_MATCH_COLUMNS, GLICKO_SCALE, GlickoModel, glicko_g
+from serve_return import SERVE_RETURN_PRE_MATCH_COLUMNS, SERVICE_POINT_COLUMNS, ServeReturnModel
+
+RATING_MODELS = {}  # Model name -> RatingModel subclass
+
+def register_model(model_class):
+    """Class decorator adding a RatingModel subclass to RATING_MODELS under its name."""
+    RATING_MODELS[model_class.name] = model_class
+    return model_class
+
+class RatingModel:
+    """Interface of a model fed by run_rating_models.py.
+
+    columns are the pre-match values the model returns besides
+    expected_winner; stat_columns are matched_atp_records columns it needs
+    beyond the standard ones, decoded once by the runner into stream["stats"].
+    """
+
+    name = None
+    columns = []
+    stat_columns = []
+
+    def add_players(self, names):
+        """Register players; ids are their positions in the runner's player list, in order."""
+        raise NotImplementedError
+
+    def process(self, stream, rows):
+        """Rate the matches stream[...][rows] (a slice of whole rating periods); returns column -> array."""
+        raise NotImplementedError
+
+@register_model
+class SurfaceEloModel(RatingModel):
+    """The surface-blended Elo of create_running_elos.py."""
+
+    name = "elo"
+    columns = PRE_MATCH_COLUMNS
+
+    def __init__(self):
+        self.engine = EloEngine()
+
+    def add_players(self, names):
+        self.engine.encode_players(names)
+
+    def process(self, stream, rows):
+        return self.engine.process(
+            stream["winners"][rows], stream["losers"][rows], stream["days"][rows],
+            stream["surfaces"][rows], stream["retired"][rows],
+        )
+
+@register_model
+class PlainEloModel(RatingModel):
+    """Textbook Elo: one overall rating, fixed K_BASE, no surfaces, decay or retirement discount."""
+
+    name = "plain_elo"
+    columns = ["winner_plain_elo", "loser_plain_elo"]
+
+    def __init__(self):
+        self.ratings = []
+
+    def add_players(self, names):
+        self.ratings.extend([float(INITIAL_RATING)] * len(names))
+
+    def process(self, stream, rows):
+        winners = stream["winners"][rows].tolist()
+        losers = stream["losers"][rows].tolist()
+        pre_match = {column: np.empty(len(winners)) for column in self.columns + ["expected_winner"]}
+        ratings = self.ratings
+        for i, (winner, loser) in enumerate(zip(winners, losers)):
+            winner_elo = ratings[winner]
+            loser_elo = ratings[loser]
+            expected_winner = expected_score(winner_elo, loser_elo)
+            pre_match["winner_plain_elo"][i] = winner_elo
+            pre_match["loser_plain_elo"][i] = loser_elo
+            pre_match["expected_winner"][i] = expected_winner
+            ratings[winner] = winner_elo + K_BASE * (1 - expected_winner)
+            ratings[loser] = loser_elo - K_BASE * (1 - expected_winner)
+        return pre_match
+
+@register_model
+class GlickoRatingModel(RatingModel):
+    """Glicko-2 by weekly rating period (glicko.py); the win probability accounts for both RDs."""
+
+    name = "glicko"
+    columns = GLICKO_PRE_MATCH_COLUMNS
+
+    def __init__(self):
+        self.model = GlickoModel()
+
+    def add_players(self, names):
+        self.model.encode_players(names)
+
+    def process(self, stream, rows):
+        pre_match = self.model.process(
+            stream["winners"][rows], stream["losers"][rows], stream["periods"][rows], stream["retired"][rows]
+        )
+        combined_phi = np.hypot(pre_match["winner_glicko_rd"], pre_match["loser_glicko_rd"]) / GLICKO_SCALE
+        rating_gap = (pre_match["winner_glicko_rating"] - pre_match["loser_glicko_rating"]) / GLICKO_SCALE
+        pre_match["expected_winner"] = 1 / (1 + np.exp(-glicko_g(combined_phi) * rating_gap))
+        return pre_match
+
+@register_model
+class ServeReturnRatingModel(RatingModel):
+    """Serve and return ratings from service points won (serve_return.py)."""
+
+    name = "serve_return"
+    columns = SERVE_RETURN_PRE_MATCH_COLUMNS
+    stat_columns = SERVICE_POINT_COLUMNS
+
+    def __init__(self):
+        self.model = ServeReturnModel()
+
+    def add_players(self, names):
+        self.model.encode_players(names)
+
+    def process(self, stream, rows):
+        return self.model.process(
+            stream["winners"][rows], stream["losers"][rows], stream["surfaces"][rows],
+            {column: stream["stats"][column][rows] for column in SERVICE_POINT_COLUMNS},
+        )
@@ -0,0 +1,92 @@
+# Live rating ranks for the Elo replay.
+# RatingRankIndex keeps the overall ratings of the players active in the last
+# active_days days in one sorted list, so a rank is a binary search and a rating
+# change is a removal plus an insertion into that list. Players drop out once
+# they have been inactive for more than active_days and come back on their
+# next match. Matches must be fed in date order.
+#
+# to_arrays / from_arrays convert the index to and from the arrays the Numba
+# replay kernel (elo_kernel.py) updates.
+from bisect import bisect_left, bisect_right, insort
+from collections import deque
+import numpy as np
+
+class RatingRankIndex:
+    """Rank of any rating among the live ratings of recently active players."""
+
+    def __init__(self, active_days):
+        self.active_days = active_days
+        self.sorted_ratings = []
+        self.entries = {}  # player -> (rating in sorted_ratings, day of last update)
+        self.expiry = deque()  # (day, player) in update order, checked by expire()
+
+    def __len__(self):
+        return len(self.sorted_ratings)
+
+    def update(self, player, rating, day):
+        """Set the player's live rating as of day (adding the player if needed)."""
+        entry = self.entries.get(player)
+        if entry is None:
+            insort(self.sorted_ratings, rating)
+        elif entry[0] != rating:
+            del self.sorted_ratings[bisect_left(self.sorted_ratings, entry[0])]
+            insort(self.sorted_ratings, rating)
+        if entry is None or entry[1] != day:
+            self.expiry.append((day, player))
+        self.entries[player] = (rating, day)
+
+    def expire(self, day):
+        """Drop players whose last update is more than active_days before day."""
+        expiry = self.expiry
+        while expiry and day - expiry[0][0] > self.active_days:
+            last_day, player = expiry.popleft()
+            entry = self.entries.get(player)
+            if entry is not None and entry[1] == last_day:
+                del self.sorted_ratings[bisect_left(self.sorted_ratings, entry[0])]
+                del self.entries[player]
+
+    def rank(self, rating):
+        """1 + the number of live ratings above rating (ties share a rank)."""
+        return len(self.sorted_ratings) - bisect_right(self.sorted_ratings, rating) + 1
+
+    def to_arrays(self, num_players, queue_room):
+        """State as arrays for elo_kernel.replay_kernel, with room for queue_room more expiry entries.
+
+        Returns (live_ratings, rank_state, entry_ratings, entry_days,
+        queue_days, queue_players); rank_state is [live count, queue head,
+        queue tail] and entry_days is -1 for players not in the index.
+        """
+        live_ratings = np.empty(num_players)
+        live_ratings[:len(self.sorted_ratings)] = self.sorted_ratings
+        entry_ratings = np.zeros(num_players)
+        entry_days = np.full(num_players, -1, dtype=np.int64)
+        for player, (rating, day) in self.entries.items():
+            entry_ratings[player] = rating
+            entry_days[player] = day
+        queue_days = np.empty(len(self.expiry) + queue_room, dtype=np.int64)
+        queue_players = np.empty(len(self.expiry) + queue_room, dtype=np.int64)
+        if self.expiry:
+            queue_days[:len(self.expiry)], queue_players[:len(self.expiry)] = zip(*self.expiry)
+        rank_state = np.array([len(self.sorted_ratings), 0, len(self.expiry)], dtype=np.int64)
+        return live_ratings, rank_state, entry_ratings, entry_days, queue_days, queue_players
+
+    @classmethod
+    def from_arrays(cls, active_days, live_ratings, rank_state, entry_ratings, entry_days, queue_days, queue_players):
+        """Rebuild the index from arrays updated by elo_kernel.replay_kernel (see to_arrays)."""
+        size, head, tail = rank_state.tolist()
+        index = cls(active_days)
+        index.sorted_ratings = live_ratings[:size].tolist()
+        live = np.flatnonzero(entry_days >= 0)
+        index.entries = dict(zip(live.tolist(), zip(entry_ratings[live].tolist(), entry_days[live].tolist())))
+        index.expiry = deque(zip(queue_days[head:tail].tolist(), queue_players[head:tail].tolist()))
+        return index
+
+    @classmethod
+    def from_ratings(cls, active_days, ratings, last_match):
+        """Rebuild the index from engine arrays (ratings as of last_match, -1 for players who never played)."""
+        index = cls(active_days)
+        players = [player for player in range(len(ratings)) if last_match[player] >= 0]
+        players.sort(key=lambda player: last_match[player])
+        for player in players:
+            index.update(player, float(ratings[player]), int(last_match[player]))
+        return index
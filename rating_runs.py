@@ -0,0 +1,196 @@
+# Versioned rating runs stored side by side in the database.
+# A run is identified by a hash of its configuration (the Elo and Glicko-2
+# constants and the engine options that change the values). Each run's
+# pre-match values go to their own partition of run_ratings, written in bulk
+# with COPY, and rating_runs records the configuration and a hash of the input
+# matches. Any earlier run can be read back with load_run, and a run whose
+# configuration and input are both unchanged doesn't need to be recomputed.
+#
+# The input hash is built from per-row hashes that add up, so a run resumed
+# from a checkpoint only hashes the matches after it, and store_run can replace
+# just the rows after the resume point.
+import csv
+import hashlib
+import io
+import json
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+import elo_engine
+import glicko
+from elo_engine import PRE_MATCH_COLUMNS
+from glicko import GLICKO_PRE_MATCH_COLUMNS
+
+RUNS_TABLE = "rating_runs"
+RUN_RATINGS_TABLE = "run_ratings"  # Partitioned by run_id, one partition per run
+RUN_COLUMNS = PRE_MATCH_COLUMNS + GLICKO_PRE_MATCH_COLUMNS
+RUN_INPUT_COLUMNS = ["matchid", "date", "winner_name", "loser_name", "surface", "comment"]
+INPUT_HASH_KEYS = ["rating_runs_in_1", "rating_runs_in_2"]  # Two 64-bit row hashes (16-character keys)
+
+ELO_CONSTANTS = [
+    "INITIAL_RATING", "DECAY_THRESHOLD_DAYS", "DECAY_RATE", "SURFACE_TYPES", "K_BASE", "K_MIN", "K_MAX",
+    "MATCH_HISTORY_LIMIT", "AVG_ELO_FACED_DECAY", "AVG_ELO_FACED_WINDOW",
+]
+ELO_OPTIONS = ["round_blend", "record_post_match_elo", "avg_elo_faced_mode"]  # Engine options that change values
+GLICKO_CONSTANTS = [
+    "GLICKO_INITIAL_RATING", "GLICKO_INITIAL_RD", "GLICKO_INITIAL_VOLATILITY", "GLICKO_TAU", "GLICKO_SCALE",
+    "GLICKO_TOLERANCE", "RATING_PERIOD_DAYS", "RETIRED_MATCH_WEIGHT",
+]
+
+def run_column_type(column):
+    # Capped match counts fit in SMALLINT; ratings are stored to 2 decimals
+    return "SMALLINT" if column.endswith("_total_matches") else "REAL"
+
+def rating_run_config(elo):
+    """Everything that determines a run's values, for an EloEngine configured as the run uses it."""
+    return {
+        "elo": {name: getattr(elo_engine, name) for name in ELO_CONSTANTS},
+        "elo_options": {name: getattr(elo, name) for name in ELO_OPTIONS},
+        "glicko": {name: getattr(glicko, name) for name in GLICKO_CONSTANTS},
+    }
+
+def config_hash(config):
+    """Run id: a short, stable hash of the configuration."""
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()[:16]
+
+def input_row_hashes(df):
+    """Hashes of each input match's RUN_INPUT_COLUMNS, shape (rows, 2).
+
+    Summed (wrapping) they give an input digest that doesn't depend on how the
+    rows were split up: the digest saved with a checkpoint plus the sum over
+    the rows after it is the digest of the whole input. The replay order
+    follows from (date, matchid), which the hashes cover.
+    """
+    rows = df[RUN_INPUT_COLUMNS].astype(str)
+    return np.column_stack([
+        pd.util.hash_pandas_object(rows, index=False, hash_key=key).to_numpy() for key in INPUT_HASH_KEYS
+    ]).reshape(-1, len(INPUT_HASH_KEYS))
+
+def input_digests(df, digest_before=None):
+    """Running input digests, shape (rows + 1, 2): row i covers the matches before df's row i.
+
+    Row 0 is digest_before (the digest of the matches before df, zero if
+    None) and the last row is the digest of the whole input.
+    """
+    start = np.zeros((1, len(INPUT_HASH_KEYS)), dtype=np.uint64)
+    if digest_before is not None:
+        start[0] = digest_before
+    return np.cumsum(np.concatenate([start, input_row_hashes(df)]), axis=0, dtype=np.uint64)
+
+def input_hash(digest):
+    """The input hash stored with a run, from its input digest."""
+    return "".join(f"{part:016x}" for part in np.asarray(digest, dtype=np.uint64).tolist())
+
+def create_run_tables(engine):
+    """Create rating_runs and the partitioned run_ratings table if they don't exist yet."""
+    column_definitions = ", ".join(f"{column} {run_column_type(column)}" for column in RUN_COLUMNS)
+    with engine.connect() as connection:
+        connection.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS {RUNS_TABLE} (
+                run_id TEXT PRIMARY KEY,
+                config JSONB NOT NULL,
+                input_hash TEXT NOT NULL,
+                num_matches INT NOT NULL,
+                created_at TIMESTAMP NOT NULL DEFAULT now()
+            )
+        """))
+        connection.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS {RUN_RATINGS_TABLE} (
+                run_id TEXT NOT NULL,
+                matchid INT NOT NULL,
+                date DATE NOT NULL,
+                {column_definitions},
+                PRIMARY KEY (run_id, matchid)
+            ) PARTITION BY LIST (run_id)
+        """))
+        # Resumed runs replace the rows after their (date, matchid) resume point
+        connection.execute(text(f"""
+            CREATE INDEX IF NOT EXISTS {RUN_RATINGS_TABLE}_date_idx ON {RUN_RATINGS_TABLE} (run_id, date, matchid)
+        """))
+        connection.commit()
+
+def stored_input_hash(engine, run_id):
+    """Input hash the run was stored with, or None if it has never been stored."""
+    with engine.connect() as connection:
+        return connection.execute(
+            text(f"SELECT input_hash FROM {RUNS_TABLE} WHERE run_id = :run_id"), {"run_id": run_id}
+        ).scalar()
+
+def latest_run_id(engine):
+    """The most recently stored run, whose replay also wrote the current Elo checkpoints."""
+    with engine.connect() as connection:
+        return connection.execute(
+            text(f"SELECT run_id FROM {RUNS_TABLE} ORDER BY created_at DESC LIMIT 1")
+        ).scalar()
+
+def list_runs(engine):
+    """Every stored run, newest first."""
+    with engine.connect() as connection:
+        return pd.read_sql(text(f"""
+            SELECT run_id, created_at, num_matches, input_hash, config
+            FROM {RUNS_TABLE}
+            ORDER BY created_at DESC
+        """), connection)
+
+def load_run(engine, run_id, after=None):
+    """A stored run's pre-match values, indexed by matchid; only the matches after (date, matchid) after if given."""
+    after_clause = "AND (date, matchid) > (:after_date, :after_match_id)" if after else ""
+    params = {"run_id": run_id}
+    if after:
+        params.update(after_date=after[0], after_match_id=after[1])
+    with engine.connect() as connection:
+        df = pd.read_sql(text(f"""
+            SELECT matchid, {", ".join(RUN_COLUMNS)}
+            FROM {RUN_RATINGS_TABLE}
+            WHERE run_id = :run_id {after_clause}
+            ORDER BY matchid
+        """), connection, params=params, index_col="matchid")
+    # REAL keeps about 7 significant digits, so this gives back the stored values
+    return df.round(2)
+
+def store_run(engine, run_id, config, input_hash, run_values, replace_after=None):
+    """Store run_values (one row per matchid, with a date column and RUN_COLUMNS) and record the run.
+
+    A full run drops, recreates and fills the run's partition. A run resumed
+    after (date, matchid) replace_after only deletes the stored rows after
+    that point and copies in run_values (the rows after it), so its cost
+    follows the matches it replayed. Either way it is one transaction, so
+    readers see either the previous version of the run or the new one.
+    """
+    partition = f"{RUN_RATINGS_TABLE}_{run_id}"
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(
+        (run_id, *row) for row in run_values[["date"] + RUN_COLUMNS].itertuples(index=True, name=None)
+    )
+    buffer.seek(0)
+
+    connection = engine.raw_connection()
+    try:
+        with connection.cursor() as cursor:
+            if replace_after is None:
+                cursor.execute(f"DROP TABLE IF EXISTS {partition}")
+                cursor.execute(
+                    f"CREATE TABLE {partition} PARTITION OF {RUN_RATINGS_TABLE} FOR VALUES IN (%s)", (run_id,)
+                )
+                num_matches = "EXCLUDED.num_matches"
+            else:
+                cursor.execute(f"DELETE FROM {partition} WHERE (date, matchid) > (%s, %s)", tuple(replace_after))
+                # Kept up to date from the rows deleted and added, without counting the partition
+                num_matches = f"{RUNS_TABLE}.num_matches - {int(cursor.rowcount)} + EXCLUDED.num_matches"
+            cursor.copy_expert(
+                f"COPY {partition} (run_id, matchid, date, {', '.join(RUN_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+                buffer,
+            )
+            cursor.execute(f"""
+                INSERT INTO {RUNS_TABLE} (run_id, config, input_hash, num_matches)
+                VALUES (%s, %s, %s, %s)
+                ON CONFLICT (run_id) DO UPDATE
+                SET config = EXCLUDED.config, input_hash = EXCLUDED.input_hash,
+                    num_matches = {num_matches}, created_at = now()
+            """, (run_id, json.dumps(config, sort_keys=True), input_hash, len(run_values)))
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
@@ -0,0 +1,112 @@
+# Rates matched_atp_records with several rating models in a single pass.
+# The matches are loaded and decoded once (rating_models.py describes the
+# decoded stream) and every selected model is fed the same chunks of whole
+# weekly rating periods in date order, so comparing another model costs one more
+# model update per chunk rather than another load and replay. Each model's
+# pre-match values and expected_winner go to model_predictions/<model>.csv and
+# its prediction metrics to model_predictions/<model>_metrics.csv.
+#
+# Usage: python3 run_rating_models.py [--models elo plain_elo glicko serve_return]
+import argparse
+import os
+import time
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from db_connect import get_engine
+from elo_engine import SURFACE_TYPES, encode_surfaces, to_days
+from elo_metrics import PredictionMetrics
+from glicko import rating_periods
+from rating_models import RATING_MODELS
+
+PREDICTIONS_DIR = "model_predictions"
+CHUNK_PERIODS = 52  # Rating periods (weeks) per chunk handed to the models
+STREAM_COLUMNS = ["matchid", "date", "winner_name", "loser_name", "surface", "comment"]
+
+def load_matches(engine, stat_columns=()):
+    """Rated matches from matched_atp_records in replay order, with any extra stat columns."""
+    columns = STREAM_COLUMNS + [column for column in stat_columns if column not in STREAM_COLUMNS]
+    with engine.connect() as connection:
+        df = pd.read_sql(text(f"""
+            SELECT {", ".join(columns)}
+            FROM matched_atp_records
+            ORDER BY date ASC, matchid ASC
+        """), connection)
+    return df[df["surface"].isin(SURFACE_TYPES) & (df["comment"] != "Walkover")].reset_index(drop=True)
+
+def decode_stream(df, stat_columns=()):
+    """The arrays every model reads: shared player ids (first appearance order), days, periods, surfaces, flags."""
+    pairs = np.column_stack([df["winner_name"].to_numpy(dtype=object), df["loser_name"].to_numpy(dtype=object)])
+    codes, player_names = pd.factorize(pairs.ravel(), use_na_sentinel=False)
+    ids = codes.reshape(-1, 2).astype(np.int64)
+    days = to_days(df["date"])
+    return {
+        "player_names": list(player_names),
+        "winners": ids[:, 0],
+        "losers": ids[:, 1],
+        "days": days,
+        "periods": rating_periods(days),
+        "surfaces": encode_surfaces(df["surface"]),
+        "retired": (df["comment"] == "Retired").to_numpy(),
+        "stats": {column: df[column].to_numpy(dtype=float) for column in stat_columns},
+    }
+
+def chunk_slices(periods, chunk_periods=CHUNK_PERIODS):
+    """Row slices of whole rating periods, chunk_periods periods each."""
+    if not len(periods):
+        return []
+    chunks = (periods - periods[0]) // chunk_periods
+    boundaries = np.flatnonzero(np.diff(chunks)) + 1
+    starts = np.r_[0, boundaries].tolist()
+    ends = np.r_[boundaries, len(periods)].tolist()
+    return [slice(start, end) for start, end in zip(starts, ends)]
+
+def run_models(models, stream, chunk_periods=CHUNK_PERIODS):
+    """Feed every chunk of the stream to every model; returns per-model pre-match values, metrics and seconds."""
+    for model in models:
+        model.add_players(stream["player_names"])
+    parts = {model.name: [] for model in models}
+    metrics = {model.name: PredictionMetrics() for model in models}
+    seconds = {model.name: 0.0 for model in models}
+    for rows in chunk_slices(stream["periods"], chunk_periods):
+        for model in models:
+            start = time.perf_counter()
+            pre_match = model.process(stream, rows)
+            seconds[model.name] += time.perf_counter() - start
+            parts[model.name].append(pre_match)
+            metrics[model.name].update(
+                pre_match["expected_winner"], stream["surfaces"][rows], stream["days"][rows], stream["retired"][rows]
+            )
+    pre_match = {
+        model.name: {
+            column: np.concatenate([part[column] for part in parts[model.name]])
+            for column in model.columns + ["expected_winner"]
+        }
+        for model in models
+    }
+    return pre_match, metrics, seconds
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rate matched_atp_records with several models in one pass.")
+    parser.add_argument("--models", nargs="+", choices=list(RATING_MODELS), default=list(RATING_MODELS))
+    args = parser.parse_args()
+    models = [RATING_MODELS[name]() for name in args.models]
+    stat_columns = list(dict.fromkeys(column for model in models for column in model.stat_columns))
+
+    print("Loading matches from database...")
+    df = load_matches(get_engine(), stat_columns)
+    print(f"Loaded {len(df)} rated matches.")
+    if df.empty:
+        exit(0)
+    stream = decode_stream(df, stat_columns)
+    pre_match, metrics, seconds = run_models(models, stream)
+
+    os.makedirs(PREDICTIONS_DIR, exist_ok=True)
+    for model in models:
+        predictions = df[["matchid", "date", "winner_name", "loser_name"]].copy()
+        for column, values in pre_match[model.name].items():
+            predictions[column] = values
+        predictions.to_csv(os.path.join(PREDICTIONS_DIR, f"{model.name}.csv"), index=False)
+        metrics[model.name].report().to_csv(os.path.join(PREDICTIONS_DIR, f"{model.name}_metrics.csv"), index=False)
+        print(f"{model.name} ({seconds[model.name]:.2f}s): {metrics[model.name].summary()}")
+    print(f"✅ Predictions written to {PREDICTIONS_DIR}/.")
@@ -0,0 +1,197 @@
+# Serve and return ratings updated from service points won.
+# Every player has a serve rating and a return rating on the logit scale: the
+# chance a player wins a point on serve is logistic(base + serve - opponent's
+# return), where base is the share of service points won so far on that
+# surface. After each match both ratings of both players move towards the
+# observed share of points won, so a single match contributes well over a
+# hundred points of evidence instead of one win or loss. The match-win
+# probability comes from the two point probabilities through the usual
+# independent-points model of games, tiebreaks and sets.
+#
+# Surface base rates and step sizes are computed over whole columns; the
+# ratings are updated in conflict-free batches (elo_batches.schedule_batches),
+# so every player still sees their matches in order.
+import numpy as np
+from elo_batches import schedule_batches
+from elo_engine import SURFACE_TYPES, PlayerIndex
+
+SERVE_POINT_RATE = 0.64  # Share of service points won assumed before any are seen
+SERVE_POINT_PRIOR = 10_000  # Weight of SERVE_POINT_RATE, in points, in each surface's base rate
+POINT_K_BASE = 0.3  # Step size (logit per unit of standardized point error) for new players
+POINT_K_MIN = 0.05  # ... and for experienced players
+BEST_OF = 3  # Sets; matched_atp_records doesn't say which matches were best of five
+
+# Pre-match values returned for every processed match
+SERVE_RETURN_PRE_MATCH_COLUMNS = [
+    "winner_serve_rating",
+    "winner_return_rating",
+    "loser_serve_rating",
+    "loser_return_rating",
+]
+# matched_atp_records columns the ratings are updated from
+SERVICE_POINT_COLUMNS = ["w_svpt", "w_1stwon", "w_2ndwon", "l_svpt", "l_1stwon", "l_2ndwon"]
+
+def logit(p):
+    return np.log(p / (1 - p))
+
+def logistic(x):
+    return 1 / (1 + np.exp(-x))
+
+def point_k(matches):
+    """Step size for players with this many matches with point data, like calculate_dynamic_k."""
+    return np.clip(POINT_K_BASE / (1 + 0.1 * np.asarray(matches)), POINT_K_MIN, POINT_K_BASE)
+
+def game_win_probability(p):
+    """Probability the server holds when winning each service point with probability p."""
+    q = 1 - p
+    deuce = p ** 2 / (p ** 2 + q ** 2)
+    return p ** 4 * (1 + 4 * q + 10 * q ** 2) + 20 * p ** 3 * q ** 3 * deuce
+
+def _race_win_probability(target, a_wins_unit, at_tie):
+    """Probability A reaches target units first (by two, with the tie at target - 1 all settled by at_tie).
+
+    a_wins_unit(k) is the probability A wins the unit after k units have been played.
+    """
+    reach = {(0, 0): 1.0}
+    a_wins = 0.0
+    for played in range(2 * target - 2):
+        for a in range(max(0, played - target + 1), min(played, target - 1) + 1):
+            b = played - a
+            probability = reach.pop((a, b))
+            p = a_wins_unit(played)
+            if a + 1 == target:
+                a_wins = a_wins + probability * p
+            else:
+                reach[a + 1, b] = reach.get((a + 1, b), 0.0) + probability * p
+            if b + 1 < target:
+                reach[a, b + 1] = reach.get((a, b + 1), 0.0) + probability * (1 - p)
+    return a_wins + reach[target - 1, target - 1] * at_tie
+
+def tiebreak_win_probability(p_a, p_b):
+    """Probability A wins a tiebreak A serves first, winning service points with p_a and B with p_b."""
+    # A serves point 0, then each player serves two in turn
+    def a_wins_point(played):
+        return p_a if (played + 1) // 2 % 2 == 0 else 1 - p_b
+
+    # From 6-6 each player serves one of every two points; A must win a pair outright
+    a_pair = p_a * (1 - p_b)
+    b_pair = (1 - p_a) * p_b
+    return _race_win_probability(7, a_wins_point, a_pair / (a_pair + b_pair))
+
+def set_win_probability(p_a, p_b):
+    """Probability A wins a tiebreak set in which A serves first."""
+    hold_a = game_win_probability(p_a)
+    hold_b = game_win_probability(p_b)
+
+    def a_wins_game(played):
+        return hold_a if played % 2 == 0 else 1 - hold_b
+
+    # From 5-5: 7-5 either way, or 6-6 and a tiebreak A serves first (game 12)
+    tiebreak = tiebreak_win_probability(p_a, p_b)
+    at_five_all = hold_a * (1 - hold_b) + (hold_a * hold_b + (1 - hold_a) * (1 - hold_b)) * tiebreak
+    return _race_win_probability(6, a_wins_game, at_five_all)
+
+def match_win_probability(p_a, p_b, best_of=BEST_OF):
+    """Probability A wins the match, with either player equally likely to serve first in each set."""
+    p_a = np.asarray(p_a, dtype=float)
+    p_b = np.asarray(p_b, dtype=float)
+    s = (set_win_probability(p_a, p_b) + 1 - set_win_probability(p_b, p_a)) / 2
+    if best_of == 5:
+        return s ** 3 * (10 - 15 * s + 6 * s ** 2)
+    return s ** 2 * (3 - 2 * s)
+
+def surface_base_logits(surfaces, points_won, points_played, won_before, played_before):
+    """Base logit of every match: surface totals so far plus the earlier matches of this call, in order."""
+    played = np.zeros((len(surfaces), len(SURFACE_TYPES)))
+    won = np.zeros((len(surfaces), len(SURFACE_TYPES)))
+    played[np.arange(len(surfaces)), surfaces] = points_played
+    won[np.arange(len(surfaces)), surfaces] = points_won
+    # Exclusive cumulative sums: only matches before each row
+    won_so_far = won_before + np.cumsum(won, axis=0) - won
+    played_so_far = played_before + np.cumsum(played, axis=0) - played
+    rows = np.arange(len(surfaces))
+    return logit(won_so_far[rows, surfaces] / played_so_far[rows, surfaces]), won.sum(axis=0), played.sum(axis=0)
+
+class ServeReturnModel(PlayerIndex):
+    """Serve and return ratings for dense player ids, updated from service points won."""
+
+    def __init__(self):
+        super().__init__()
+        self.serve = np.empty(0)
+        self.return_ = np.empty(0)
+        self.point_matches = np.empty(0, dtype=np.int64)  # Matches with point data per player
+        self.surface_points_won = np.full(len(SURFACE_TYPES), SERVE_POINT_RATE * SERVE_POINT_PRIOR)
+        self.surface_points_played = np.full(len(SURFACE_TYPES), float(SERVE_POINT_PRIOR))
+
+    def _add_players(self, names):
+        count = len(names)
+        self.serve = np.concatenate([self.serve, np.zeros(count)])
+        self.return_ = np.concatenate([self.return_, np.zeros(count)])
+        self.point_matches = np.concatenate([self.point_matches, np.zeros(count, dtype=np.int64)])
+
+    def process(self, winners, losers, surfaces, service_points):
+        """Rate date-ordered matches; service_points maps SERVICE_POINT_COLUMNS to arrays (NaN when missing).
+
+        Returns the pre-match ratings keyed by SERVE_RETURN_PRE_MATCH_COLUMNS
+        plus expected_winner. Matches without point data are predicted but
+        don't change any rating.
+        """
+        winners = np.asarray(winners, dtype=np.int64)
+        losers = np.asarray(losers, dtype=np.int64)
+        surfaces = np.asarray(surfaces, dtype=np.int64)
+        winner_played = np.asarray(service_points["w_svpt"], dtype=float)
+        loser_played = np.asarray(service_points["l_svpt"], dtype=float)
+        winner_won = np.asarray(service_points["w_1stwon"], dtype=float) + service_points["w_2ndwon"]
+        loser_won = np.asarray(service_points["l_1stwon"], dtype=float) + service_points["l_2ndwon"]
+        has_points = (
+            (winner_played > 0) & (loser_played > 0) & np.isfinite(winner_won) & np.isfinite(loser_won)
+            & (winner_won <= winner_played) & (loser_won <= loser_played)
+        )
+        winner_played = np.where(has_points, winner_played, 0.0)
+        loser_played = np.where(has_points, loser_played, 0.0)
+        winner_won = np.where(has_points, winner_won, 0.0)
+        loser_won = np.where(has_points, loser_won, 0.0)
+        winner_share = np.where(has_points, winner_won / np.maximum(winner_played, 1), 0.0)
+        loser_share = np.where(has_points, loser_won / np.maximum(loser_played, 1), 0.0)
+
+        base, surface_won, surface_played = surface_base_logits(
+            surfaces, winner_won + loser_won, winner_played + loser_played,
+            self.surface_points_won, self.surface_points_played,
+        )
+        self.surface_points_won += surface_won
+        self.surface_points_played += surface_played
+
+        pre_match = {column: np.empty(len(winners)) for column in SERVE_RETURN_PRE_MATCH_COLUMNS}
+        winner_point = np.empty(len(winners))
+        loser_point = np.empty(len(winners))
+        batches = schedule_batches(winners, losers)
+        order = np.argsort(batches, kind="stable")
+        boundaries = np.flatnonzero(np.diff(batches[order])) + 1
+        for rows in np.split(order, boundaries):
+            if not len(rows):
+                continue
+            winner, loser = winners[rows], losers[rows]
+            winner_serve, winner_return = self.serve[winner], self.return_[winner]
+            loser_serve, loser_return = self.serve[loser], self.return_[loser]
+            pre_match["winner_serve_rating"][rows] = winner_serve
+            pre_match["winner_return_rating"][rows] = winner_return
+            pre_match["loser_serve_rating"][rows] = loser_serve
+            pre_match["loser_return_rating"][rows] = loser_return
+            winner_point[rows] = p_winner = logistic(base[rows] + winner_serve - loser_return)
+            loser_point[rows] = p_loser = logistic(base[rows] + loser_serve - winner_return)
+
+            # Point-share errors in standard units of the logit (one Newton step), scaled by experience
+            winner_error = (winner_share[rows] - p_winner) / (p_winner * (1 - p_winner))
+            loser_error = (loser_share[rows] - p_loser) / (p_loser * (1 - p_loser))
+            counted = has_points[rows]
+            winner_k = np.where(counted, point_k(self.point_matches[winner]), 0.0)
+            loser_k = np.where(counted, point_k(self.point_matches[loser]), 0.0)
+            self.serve[winner] = winner_serve + winner_k * winner_error
+            self.return_[winner] = winner_return - winner_k * loser_error
+            self.serve[loser] = loser_serve + loser_k * loser_error
+            self.return_[loser] = loser_return - loser_k * winner_error
+            self.point_matches[winner] += counted
+            self.point_matches[loser] += counted
+
+        pre_match["expected_winner"] = match_win_probability(winner_point, loser_point)
+        return pre_match